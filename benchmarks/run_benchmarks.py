@@ -0,0 +1,252 @@
+# benchmarks/run_benchmarks.py
+
+"""
+合成コーパスを使ったベンチマーク
+
+    python benchmarks/run_benchmarks.py [--corpus-dir DIR] [--workers N] [--repeat N]
+                                        [--tolerance 0.5] [--fail-on-slower] [--stream-window SEC]
+                                        [--update-baseline]
+
+- 処理段階ごと（読み込み・多ピッチ推定・フレーム音量・判定方式ごとのフレーム分析）の時間と
+  main.py --test によるバッチ全体の時間を計測する
+- 判定結果を benchmarks/baseline.json と比較し、判定が変わった場合は終了コード1で終了する
+- 時間が基準値の (1 + tolerance) 倍を超えた処理段階は出力するだけにする（--fail-on-slower の場合は終了コード1）
+  時間の基準値は実行環境やキャッシュの状態に依存するため、時間で失敗させる場合は計測するマシンで
+  --update-baseline を実行して作り直す
+- ストリーミング解析（ウィンドウの長さ --stream-window、既定10秒）と全体の解析の和音フレーム数・判定の違いを出力する
+  （ウィンドウごとの多ピッチ推定は全体の推定と一致しないため、比較は参考値で失敗にはしない）
+"""
+
+import os
+import io
+import re
+import sys
+import json
+import time
+import shutil
+import tempfile
+import contextlib
+import subprocess
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from modules.config_loader import load_config
+from modules.audio_processor import load_and_preprocess_audio
+from modules.feature_extractor import extract_features
+from modules.frame_volume import compute_frame_volumes
+from modules.judge import analyze_frame_types
+from modules.analysis import judge_file
+from modules.stream_analysis import judge_streaming
+from modules.judgment_methods.factory import create_judgment_method
+
+from synthetic_corpus import generate_corpus, load_labels
+
+BASELINE_PATH = os.path.join(REPO_DIR, 'benchmarks', 'baseline.json')
+JUDGMENT_METHODS = ('two_stage', 'pitch_distribution', 'pitch_weighted')
+
+def get_option_value(name, default=None):
+    if name in sys.argv:
+        index = sys.argv.index(name)
+        if index + 1 < len(sys.argv):
+            return sys.argv[index + 1]
+    return default
+
+def timed(stage_times, name, fn, *args):
+    """
+    関数の実行時間を処理段階ごとに加算する
+    """
+    started = time.perf_counter()
+    result = fn(*args)
+    stage_times[name] = stage_times.get(name, 0.0) + time.perf_counter() - started
+    return result
+
+def run_stages(corpus_dir, labels, config):
+    """
+    処理段階ごとの時間と判定方式ごとの判定結果を求める
+    """
+    stage_times = {}
+    verdicts = {}
+    for rel_path in sorted(labels):
+        file_path = os.path.join(corpus_dir, rel_path)
+        y, sr = timed(stage_times, 'decode', load_and_preprocess_audio, file_path, config)
+        pitches = timed(stage_times, 'multipitch', extract_features, y, sr, config)
+        frame_volumes = timed(stage_times, 'frame_volume', compute_frame_volumes, y, config, len(pitches))
+
+        verdicts[rel_path] = {}
+        for method_name in JUDGMENT_METHODS:
+            method = create_judgment_method(method_name)
+            _, stats = timed(
+                stage_times, f"frame_analysis_{method_name}",
+                analyze_frame_types, frame_volumes, pitches, config, method
+            )
+            analyzed_frames = stats['total_frames'] - stats['skip_frames']
+            verdicts[rel_path][method_name] = method.make_judgment(stats, analyzed_frames, config)
+    return stage_times, verdicts
+
+def compare_streaming(corpus_dir, labels, config, window_sec):
+    """
+    ストリーミング解析と全体の解析の判定・和音フレーム数を比べる
+    Returns:
+        dict: 相対パス → {'full': [判定, 和音フレーム数], 'stream': [判定, 和音フレーム数]}（違いのあるファイルのみ）
+    """
+    full_config = dict(config, streaming_threshold_sec=None, max_memory_mb=None)
+    differences = {}
+    for rel_path in sorted(labels):
+        file_path = os.path.join(corpus_dir, rel_path)
+        full_judgment, full_stats = judge_file(file_path, full_config)
+        stream_judgment, stream_stats = judge_streaming(file_path, config, window_sec)
+        full = [full_judgment, full_stats['chord_frames']]
+        stream = [stream_judgment, stream_stats['chord_frames']]
+        if full != stream:
+            differences[rel_path] = {'full': full, 'stream': stream}
+    return differences
+
+def run_end_to_end(corpus_dir, workers):
+    """
+    main.py --test でバッチ全体を実行し、時間と判定結果を求める
+    """
+    command = [sys.executable, 'main.py', corpus_dir, '--test', '--no-cache', '--full', '--no-manifest']
+    if workers > 1:
+        command += ['--workers', str(workers)]
+
+    started = time.perf_counter()
+    completed = subprocess.run(command, cwd=REPO_DIR, capture_output=True, text=True, check=True)
+    elapsed = time.perf_counter() - started
+
+    verdicts = {}
+    for line in completed.stdout.splitlines():
+        match = re.match(r'^(.+?) \| (CHORD|MELODY)$', line)
+        if match:
+            verdicts[match.group(1)] = match.group(2).lower()
+    return elapsed, verdicts
+
+def accuracy(labels, verdicts):
+    if not labels:
+        return 0.0
+    return sum(1 for path, label in labels.items() if verdicts.get(path) == label) / len(labels)
+
+def compare_with_baseline(results, baseline, tolerance):
+    """
+    基準値と比較する
+    Returns:
+        tuple: (判定が変わったファイルの一覧, 時間が基準値の (1 + tolerance) 倍を超えた処理段階の一覧)
+    """
+    problems = []
+    for rel_path, method_verdicts in baseline['verdicts'].items():
+        for method_name, verdict in method_verdicts.items():
+            current = results['verdicts'].get(rel_path, {}).get(method_name)
+            if current != verdict:
+                problems.append(f"Verdict changed: {rel_path} [{method_name}] {verdict} -> {current}")
+
+    for rel_path, verdict in baseline['end_to_end_verdicts'].items():
+        current = results['end_to_end_verdicts'].get(rel_path)
+        if current != verdict:
+            problems.append(f"Verdict changed: {rel_path} [main.py] {verdict} -> {current}")
+
+    slower = []
+    timings = dict(results['stages'], end_to_end=results['end_to_end_sec'])
+    baseline_timings = dict(baseline['stages'], end_to_end=baseline['end_to_end_sec'])
+    for name, baseline_sec in baseline_timings.items():
+        current_sec = timings.get(name)
+        if current_sec is not None and current_sec > baseline_sec * (1 + tolerance):
+            slower.append(
+                f"Slower: {name} {baseline_sec:.3f}s -> {current_sec:.3f}s "
+                f"(+{(current_sec / baseline_sec - 1) * 100:.0f}%)"
+            )
+    return problems, slower
+
+def main():
+    corpus_dir = get_option_value('--corpus-dir', None)
+    workers = int(get_option_value('--workers', 1))
+    repeat = int(get_option_value('--repeat', 3))
+    tolerance = float(get_option_value('--tolerance', 0.5))
+    fail_on_slower = '--fail-on-slower' in sys.argv
+    stream_window_sec = float(get_option_value('--stream-window', 10))
+    update_baseline = '--update-baseline' in sys.argv
+
+    config = load_config(os.path.join(REPO_DIR, 'config.yaml'))
+    # ベンチマークは毎回全フレームを解析する
+    config['feature_cache_enabled'] = False
+    config['full_analysis'] = True
+
+    temporary_dir = None
+    if corpus_dir is None:
+        temporary_dir = tempfile.mkdtemp(prefix='acm_bench_')
+        corpus_dir = temporary_dir
+    corpus_dir = os.path.abspath(corpus_dir)
+
+    try:
+        if not os.path.exists(os.path.join(corpus_dir, 'labels.json')):
+            generate_corpus(corpus_dir)
+        labels = load_labels(corpus_dir)
+
+        # 処理段階ごとの時間はrepeat回のうち最小値をとる
+        stage_times = None
+        for _ in range(repeat):
+            with contextlib.redirect_stdout(io.StringIO()):
+                times, verdicts = run_stages(corpus_dir, labels, config)
+            stage_times = times if stage_times is None else {
+                name: min(stage_times[name], times[name]) for name in times
+            }
+        with contextlib.redirect_stdout(io.StringIO()):
+            stream_differences = compare_streaming(corpus_dir, labels, config, stream_window_sec)
+        end_to_end_sec, end_to_end_verdicts = run_end_to_end(corpus_dir, workers)
+    finally:
+        if temporary_dir is not None:
+            shutil.rmtree(temporary_dir, ignore_errors=True)
+
+    results = {
+        'files': len(labels),
+        'stages': stage_times,
+        'end_to_end_sec': end_to_end_sec,
+        'verdicts': verdicts,
+        'end_to_end_verdicts': end_to_end_verdicts,
+        'streaming': {'window_sec': stream_window_sec, 'differences': stream_differences},
+        'accuracy': {
+            method_name: accuracy(labels, {path: v[method_name] for path, v in verdicts.items()})
+            for method_name in JUDGMENT_METHODS
+        },
+    }
+
+    print(f"Files: {results['files']}")
+    for name, seconds in stage_times.items():
+        print(f"- {name:<34} {seconds:8.3f}s")
+    print(f"- {'end_to_end (main.py)':<34} {end_to_end_sec:8.3f}s")
+    for method_name, value in results['accuracy'].items():
+        print(f"Accuracy [{method_name}]: {value * 100:.1f}%")
+    verdict_changes = sum(1 for d in stream_differences.values() if d['full'][0] != d['stream'][0])
+    print(
+        f"Streaming ({stream_window_sec:g}s windows) vs full analysis: "
+        f"{len(stream_differences)} files differ in chord frames, {verdict_changes} in verdict"
+    )
+    for rel_path, difference in stream_differences.items():
+        (full_judgment, full_chords), (stream_judgment, stream_chords) = difference['full'], difference['stream']
+        print(f"- {rel_path}: full {full_judgment} ({full_chords} chord frames), "
+              f"stream {stream_judgment} ({stream_chords} chord frames)")
+
+    if update_baseline or not os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Baseline written: {BASELINE_PATH}")
+        return
+
+    with open(BASELINE_PATH) as f:
+        baseline = json.load(f)
+    problems, slower = compare_with_baseline(results, baseline, tolerance)
+    if slower:
+        print(f"Timing differences against baseline (tolerance {tolerance * 100:.0f}%, machine dependent):")
+        for line in slower:
+            print(f"- {line}")
+    if fail_on_slower:
+        problems += slower
+    if problems:
+        print("=" * 80)
+        print("BENCHMARK REGRESSION")
+        for problem in problems:
+            print(problem)
+        sys.exit(1)
+    print("No regressions against baseline.")
+
+if __name__ == "__main__":
+    main()
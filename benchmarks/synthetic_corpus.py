@@ -0,0 +1,123 @@
+# benchmarks/synthetic_corpus.py
+
+import os
+import json
+import zlib
+
+import numpy as np
+import soundfile as sf
+
+# 生成するクリップの長さ（秒）とサンプリングレート
+DURATIONS = (2, 10, 30)
+SAMPLE_RATES = (44100, 48000)
+
+# (名前, 正解ラベル, 波形, 前後に無音を付けるか)
+CLIP_KINDS = (
+    ('sine_melody', 'melody', 'sine', False),
+    ('saw_melody', 'melody', 'saw', False),
+    ('triad_bass', 'chord', 'saw', False),
+    ('padded_melody', 'melody', 'sine', True),
+    ('padded_triad', 'chord', 'sine', True),
+)
+
+# 三和音（ルートからの半音数）
+TRIADS = ((0, 4, 7), (0, 3, 7))
+
+LABELS_FILE = 'labels.json'
+
+def midi_to_hz(note):
+    return 440.0 * 2.0 ** ((note - 69) / 12.0)
+
+def _tone(frequencies, duration, sr, waveform):
+    """
+    指定した周波数の音を重ねた信号（のこぎり波はナイキスト周波数以下の倍音で合成する）
+    """
+    t = np.arange(int(duration * sr)) / sr
+    y = np.zeros(len(t))
+    for frequency in frequencies:
+        if waveform == 'saw':
+            harmonics = np.arange(1, int((sr / 2) // frequency) + 1)
+            for k in harmonics[:20]:
+                y += np.sin(2 * np.pi * k * frequency * t) / k
+        else:
+            y += np.sin(2 * np.pi * frequency * t)
+
+    # クリックノイズを避けるため前後をフェードする
+    fade = min(len(y) // 2, int(0.01 * sr))
+    if fade > 0:
+        ramp = np.linspace(0.0, 1.0, fade)
+        y[:fade] *= ramp
+        y[-fade:] *= ramp[::-1]
+    return y / max(len(frequencies), 1)
+
+def melody_clip(rng, duration, sr, waveform):
+    """
+    単音のメロディ（0.25〜0.5秒の音符の連続）
+    """
+    notes = []
+    remaining = duration
+    while remaining > 0:
+        length = min(remaining, rng.choice([0.25, 0.375, 0.5]))
+        note = int(rng.integers(60, 84))
+        notes.append(_tone([midi_to_hz(note)], length, sr, waveform))
+        remaining -= length
+    return np.concatenate(notes)
+
+def chord_clip(rng, duration, sr, waveform):
+    """
+    ベース音付きの三和音（1〜2秒のコードの連続）
+    """
+    chords = []
+    remaining = duration
+    while remaining > 0:
+        length = min(remaining, rng.choice([1.0, 1.5, 2.0]))
+        root = int(rng.integers(55, 67))
+        triad = TRIADS[int(rng.integers(len(TRIADS)))]
+        notes = [root + interval for interval in triad] + [root - 24]
+        chords.append(_tone([midi_to_hz(note) for note in notes], length, sr, waveform))
+        remaining -= length
+    return np.concatenate(chords)
+
+def clip_relative_path(kind, duration, sr):
+    return os.path.join(kind, str(sr), f"{kind}_{duration:02d}s_MLD.wav")
+
+def generate_clip(kind, label, waveform, padded, duration, sr):
+    """
+    1クリップ分の信号を生成（名前から決まるシードで常に同じ信号になる）
+    """
+    rng = np.random.default_rng(zlib.crc32(f"{kind}/{duration}/{sr}".encode('utf-8')))
+    body_duration = duration * 0.6 if padded else duration
+    if label == 'chord':
+        y = chord_clip(rng, body_duration, sr, waveform)
+    else:
+        y = melody_clip(rng, body_duration, sr, waveform)
+
+    if padded:
+        silence = np.zeros(int(duration * 0.2 * sr))
+        y = np.concatenate([silence, y, silence])
+    return (0.5 * y).astype(np.float32)
+
+def generate_corpus(out_dir):
+    """
+    合成コーパスを生成し、正解ラベルを labels.json に保存する
+    Returns:
+        dict: {相対パス: 'chord' or 'melody'}
+    """
+    labels = {}
+    for kind, label, waveform, padded in CLIP_KINDS:
+        for duration in DURATIONS:
+            for sr in SAMPLE_RATES:
+                rel_path = clip_relative_path(kind, duration, sr)
+                path = os.path.join(out_dir, rel_path)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                y = generate_clip(kind, label, waveform, padded, duration, sr)
+                sf.write(path, y, sr, subtype='PCM_16')
+                labels[rel_path] = label
+
+    with open(os.path.join(out_dir, LABELS_FILE), 'w') as f:
+        json.dump(labels, f, indent=2, sort_keys=True)
+    return labels
+
+def load_labels(corpus_dir):
+    with open(os.path.join(corpus_dir, LABELS_FILE)) as f:
+        return json.load(f)
@@ -2,111 +2,360 @@
 
 import sys
 import os
+import json
 from modules.config_loader import load_config
 from modules.logger import init_logger
-from modules.audio_processor import load_and_preprocess_audio
-from modules.feature_extractor import extract_features
-from modules.judge import judge_chord_or_melody
-from modules.renamer import rename_file
-
-def process_file(file_path, config, logger):
-    try:
-        # オーディオファイルの読み込みと前処理
-        y, sr = load_and_preprocess_audio(file_path, config)
-        # 特徴量抽出
-        pitches = extract_features(y, sr, config)
-        # 判定
-        judgment = judge_chord_or_melody(pitches, config)
-        # リネーム
-        rename_file(file_path, judgment, logger)
-    except Exception as e:
-        logger.error(f"Error processing {file_path}: {e}")
-
-def process_file_test_mode(file_path, config, logger):
-    try:
-        # data_dirからの相対パスを計算
-        rel_path = os.path.relpath(file_path, sys.argv[1])
-        
-        # 相対パスを表示（先頭の改行は削除）
-        print(f"{rel_path} | ", end='')
-        
-        # オーディオファイルの読み込みと前処理
-        y, sr = load_and_preprocess_audio(file_path, config)
-        # 特徴量抽出
-        pitches = extract_features(y, sr, config)
-        
-        # 判定（結果は関数内で出力）
-        judgment = judge_chord_or_melody(y, pitches, config)
-        
-    except Exception as e:
-        logger.error(f"Error processing {file_path}: {e}")
-
-def sort_files_by_hierarchy(files):
+from modules.renamer import RenameWriter, resume_renames, undo_renames
+from modules.batch_runner import iter_batch_results, iter_sequential_results
+from modules.pipeline import iter_pipelined_results, PipelineMetrics
+from modules.manifest import open_manifest
+from modules.file_finder import iter_wav_files, list_directory
+from modules.profiler import ProfileReport
+from modules.instance_pool import summarize_instance_counts
+from modules.feature_cache import open_feature_cache
+from modules.result_export import open_result_writer
+from modules.memory_budget import plan_memory, planned_memory_mb
+from modules.sweep import load_sweep_configs, load_labels, run_sweep, write_sweep_results
+from modules.sharding import parse_shard, ShardRun, merge_shards
+from modules.service import serve
+
+def recorded_result(manifest, file_path):
     """
-    ファイルパスを階層ごとに昇順でソート
+    マニフェストに記録済みで変更のないファイルの結果（なければNone）
     """
-    return sorted(files, key=lambda x: (os.path.dirname(x), os.path.basename(x)))
+    entry = manifest.lookup(file_path)
+    if entry is None:
+        return None
+    return {
+        'file_path': file_path,
+        'judgment': entry['verdict'],
+        'stats': entry['stats'],
+        'output': entry['output'],
+        'profile': None,
+        'pstats_data': None,
+        'error': None,
+        'from_manifest': True,
+    }
 
-def find_wav_files(directory):
+def run_sweep_mode(directory_path, config, logger):
     """
-    指定されたディレクトリから条件に合うWAVファイルを再帰的に探索
-    - 拡張子が.wav
-    - ファイル名（拡張子を除く）に"_MLD"が含まれる
+    特徴量をファイルごとに1度だけ取得し、スイープファイルの全ての設定で判定する
     """
-    wav_files = []
-    for root, _, files in os.walk(directory):
-        for file in files:
-            if file.lower().endswith('.wav'):
-                name_without_ext = os.path.splitext(file)[0]
-                if "_MLD" in name_without_ext:
-                    wav_files.append(os.path.join(root, file))
-    return wav_files
+    sweep_configs = load_sweep_configs(get_option_value('--sweep'), config)
+    labels_path = get_option_value('--labels', os.path.join(directory_path, 'labels.json'))
+    labels = load_labels(labels_path) if os.path.exists(labels_path) else None
+
+    wav_files = iter_wav_files(directory_path, config.get('discovery_threads', 8))
+    logger.info(f"Sweeping {len(sweep_configs)} configurations.")
+    matrix, summaries = run_sweep(
+        directory_path, wav_files, sweep_configs, config, open_feature_cache(config), logger, labels
+    )
+    csv_path, json_path = write_sweep_results(
+        get_option_value('--sweep-out', 'sweep_results.csv'), matrix, sweep_configs, summaries
+    )
+
+    logger.info("=" * 80)
+    logger.info(f"Files: {len(matrix)}")
+    for summary in summaries:
+        line = f"{summary['id']}: chord {summary['chord']:4d} / melody {summary['melody']:4d}, agreement {summary['agreement'] * 100:5.1f}%"
+        if 'accuracy' in summary:
+            line += f", accuracy {summary['accuracy'] * 100:5.1f}%"
+        logger.info(f"{line} {json.dumps(summary['config'], ensure_ascii=False)}")
+    if labels:
+        best = max(summaries, key=lambda summary: summary['accuracy'])
+        logger.info(f"Best accuracy: {best['id']} ({best['accuracy'] * 100:.1f}%)")
+    logger.info(f"Verdict matrix written to {csv_path}, summary to {json_path}")
+
+def run_merge_mode(directory_path, config, logger):
+    """
+    --shard i/N で処理した全シャードの結果を、階層順に1つのレポートにまとめる
+    （--export を指定した場合はまとめた結果を列形式でも書き出す）
+    """
+    shard_dir = config.get('shard_dir') or os.path.join(directory_path, '.shards')
+    merged, errors, incomplete = merge_shards(shard_dir)
+    result_writer = open_result_writer(config, logger)
+
+    for index, entry in enumerate(merged):
+        if index > 0:
+            print()  # ファイル間の空行
+        print(f"{entry['rel_path']} | ", end='')
+        print(entry['output'], end='')
+    # エラーのまま残っているファイルは判定結果と分けて報告する
+    for entry in errors:
+        logger.error(f"Error processing {entry['rel_path']}: {entry['error']}")
+    if result_writer is not None:
+        for entry in merged + errors:
+            result_writer.add({
+                'file_path': os.path.join(directory_path, entry['rel_path']),
+                'judgment': entry['judgment'],
+                'stats': entry['stats'],
+                'error': entry['error'],
+                'profile': entry['profile'],
+            })
+        rows = result_writer.close()
+        logger.info(f"Exported {rows} results to {result_writer.path}")
+    logger.info("\n" + "=" * 80)
+    logger.info(f"Merged {len(merged)} results ({len(errors)} errors) from {shard_dir}")
+    if incomplete:
+        logger.warning(f"Shards not finished yet: {', '.join(str(shard) for shard in incomplete)}")
+
+def get_option_value(name, default=None):
+    """
+    コマンドライン引数から「--name 値」形式のオプション値を取得
+    """
+    if name in sys.argv:
+        index = sys.argv.index(name)
+        if index + 1 < len(sys.argv):
+            return sys.argv[index + 1]
+    return default
 
 def main():
     if len(sys.argv) < 2:
-        print("Usage: python main.py <directory_path> [--test]")
+        print("Usage: python main.py --serve [--workers N] [--socket PATH | --port N] [--no-cache] [--full] [--max-memory MB]")
+        print("       python main.py <directory_path> [--test] [--workers N] [--no-cache | --rebuild-cache] [--stream] [--full | --early-exit] [--no-pipeline] [--max-memory MB] [--profile N] [--no-manifest] [--fast-dirs] [--plan | --resume-renames | --undo-renames] [--export PATH [--export-frames]] [--sweep SWEEP_FILE [--labels LABELS_FILE] [--sweep-out PATH]] [--shard i/N | --merge-shards] [--shard-dir PATH]")
         sys.exit(1)
 
     directory_path = sys.argv[1]
+    # 常駐してHTTP/Unixソケットで判定リクエストを受け付ける
+    serve_mode = "--serve" in sys.argv
     test_mode = "--test" in sys.argv
+    # リネームせず、リネームの一覧だけを出力する
+    plan_mode = "--plan" in sys.argv
+    workers = int(get_option_value('--workers', 1))
 
-    if not os.path.isdir(directory_path):
+    if not serve_mode and not os.path.isdir(directory_path):
         print("Invalid directory path.")
         sys.exit(1)
 
     # 設定の読み込み
     config = load_config('config.yaml')
+    if "--no-cache" in sys.argv:
+        config['feature_cache_enabled'] = False
+    if "--rebuild-cache" in sys.argv:
+        config['feature_cache_rebuild'] = True
+        config['full_analysis'] = True
+    if "--profile" in sys.argv:
+        # 処理時間の長いN件のcProfile結果を保存する
+        config['profile_top_n'] = int(get_option_value('--profile', 10))
+    if "--full" in sys.argv:
+        # 早期打ち切りをせず全フレームを解析する
+        config['full_analysis'] = True
+    if "--early-exit" in sys.argv:
+        # キャッシュにないファイルはウィンドウ単位で解析し、判定が確定した時点で打ち切る
+        config['full_analysis'] = False
+    if "--no-manifest" in sys.argv:
+        # 前回の結果を使わずに全てのファイルを処理する
+        config['manifest_enabled'] = False
+    if "--fast-dirs" in sys.argv:
+        config['manifest_skip_unchanged_dirs'] = True
+    if "--export" in sys.argv:
+        # ファイルごとの結果を列形式で書き出す（.parquet またはNPZのディレクトリ）
+        config['result_export_path'] = get_option_value('--export')
+    if "--export-frames" in sys.argv:
+        config['result_export_frames'] = True
+    if "--stream" in sys.argv:
+        # 全てのファイルをストリーミング解析する
+        config['streaming_threshold_sec'] = 0
+    if "--no-pipeline" in sys.argv:
+        # 読み込み・デコードを先行させずに1ファイルずつ処理する
+        config['pipeline_enabled'] = False
+    if "--max-memory" in sys.argv:
+        # 全体のメモリ使用量の上限（MB）
+        config['max_memory_mb'] = int(get_option_value('--max-memory'))
+    if "--shard-dir" in sys.argv:
+        # シャードのリース・結果を置く共有ディレクトリ
+        config['shard_dir'] = get_option_value('--shard-dir')
+    shard = None
+    if "--shard" in sys.argv:
+        # 複数のノードで分担する: 相対パスのハッシュ値でi番目（1〜N）のシャードに属するファイルだけを処理する
+        shard = parse_shard(get_option_value('--shard'))
     
     # ロガーの初期化
     logger = init_logger(config)
+
+    journal_path = config.get('rename_journal_path', 'rename_journal.jsonl')
+    if shard is not None:
+        # 同じホストで複数のシャードを動かしてもジャーナルを共有しない
+        base, ext = os.path.splitext(journal_path)
+        journal_path = f"{base}.shard-{shard[0]}{ext}"
+    if "--resume-renames" in sys.argv:
+        # 中断した実行の未完了のリネームを完了させる
+        count = resume_renames(journal_path, logger)
+        logger.info(f"Resumed {count} renames from {journal_path}.")
+        return
+    if "--undo-renames" in sys.argv:
+        # 最後の実行のリネームを取り消す
+        count = undo_renames(journal_path, logger)
+        logger.info(f"Undid {count} renames from {journal_path}.")
+        return
     
-    # 条件に合うファイルを探索
-    wav_files = find_wav_files(directory_path)
-    
-    # ファイルを階層ごとにソート
-    sorted_wav_files = sort_files_by_hierarchy(wav_files)
-    
-    logger.info(f"Found {len(sorted_wav_files)} wav files with '_MLD' in name.")
+    if "--sweep" in sys.argv:
+        # 複数の判定設定をまとめて評価する（リネームはしない）
+        run_sweep_mode(directory_path, config, logger)
+        return
+    if "--merge-shards" in sys.argv:
+        run_merge_mode(directory_path, config, logger)
+        return
+
+    if serve_mode and "--workers" not in sys.argv:
+        workers = config.get('service_workers', 2)
+    # メモリの上限に合わせてワーカー数・1ファイルの予算を決める（予算を超えるファイルはストリーミング解析する）
+    workers, file_budget_mb, overrides = plan_memory(config, workers)
+    if file_budget_mb is not None:
+        if overrides:
+            # パイプラインで同時に保持するファイル数を減らして1ファイルの予算を確保する
+            config.update(overrides)
+            logger.info(f"Pipeline limited to fit the memory budget: {overrides}")
+        config['file_memory_budget_mb'] = file_budget_mb
+        # 先読みする内容も合計で1ファイルの予算に収める
+        config['pipeline_prefetch_max_mb'] = min(
+            config.get('pipeline_prefetch_max_mb', 256), file_budget_mb / config.get('pipeline_queue_depth', 4)
+        )
+        logger.info(f"Memory budget: {config['max_memory_mb']}MB -> {workers} workers, {file_budget_mb}MB per file")
+        planned_mb = planned_memory_mb(config, workers, file_budget_mb)
+        if planned_mb > config['max_memory_mb']:
+            logger.warning(
+                f"Memory budget {config['max_memory_mb']}MB is too small: at least {planned_mb:.0f}MB is needed "
+                f"for {workers} workers with {file_budget_mb}MB per file (min_file_memory_mb)"
+            )
+
+    if serve_mode:
+        serve(
+            config, workers, logger,
+            socket_path=get_option_value('--socket', config.get('service_socket', None)),
+            host=config.get('service_host', '127.0.0.1'),
+            port=int(get_option_value('--port', config.get('service_port', 8765))),
+        )
+        return
+
+    # 条件に合うファイルを探索しながら階層順に処理する（マニフェストがあれば前回の記録も使う）
+    manifest = open_manifest(config)
+    lookup = None
+    list_function = list_directory
+    if manifest is not None:
+        # キャッシュを作り直す場合は全てのファイルを解析し直す（結果はマニフェストに記録する）
+        if not config.get('feature_cache_rebuild', False):
+            lookup = lambda file_path: recorded_result(manifest, file_path)
+        list_function = manifest.list_directory
+    walk = lambda: iter_wav_files(directory_path, config.get('discovery_threads', 8), list_function)
+    shard_run = None
+    if shard is not None:
+        shard_run = ShardRun(
+            directory_path, shard[0], shard[1],
+            config.get('shard_dir') or os.path.join(directory_path, '.shards'),
+            config.get('shard_lease_timeout_sec', 300), logger,
+        )
+        logger.info(f"Processing shard {shard[0]}/{shard[1]} (results in {shard_run.shard_dir})")
+        wav_files = shard_run.iter_files(walk)
+    else:
+        wav_files = walk()
+
+    logger.info("Searching wav files with '_MLD' in name.")
     logger.info("=" * 80)
     
     if test_mode:
         logger.info("TEST MODE - No files will be renamed")
         logger.info("=" * 80)
         logger.info("")  # 最初の空行
-        
-        # テストモードでの処理
-        for i, file_path in enumerate(sorted_wav_files):
-            process_file_test_mode(file_path, config, logger)
-            
-            # 最後のファイル以外は空行を追加
-            if i < len(sorted_wav_files) - 1:
-                print()  # ファイル間の空行
-    else:
-        # 通常モードでの処理
-        for file_path in sorted_wav_files:
-            process_file(file_path, config, logger)
+
+    # 処理段階ごとの計測結果
+    report = ProfileReport(
+        config.get('stage_log_path', None),
+        config.get('profile_top_n', 0),
+        config.get('profile_dir', 'profiles'),
+    )
+
+    # リネームはバックグラウンドでまとめて行う
+    renamer = None
+    if not test_mode:
+        renamer = RenameWriter(logger, journal_path, plan=plan_mode)
+
+    pipeline_metrics = None
+    if workers == 1 and config.get('pipeline_enabled', True):
+        pipeline_metrics = PipelineMetrics()
+
+    def iter_results(file_paths):
+        if workers > 1:
+            # 並列処理（キャッシュは各ワーカーで開く）
+            return iter_batch_results(file_paths, config, workers, lookup)
+        if pipeline_metrics is not None:
+            # 読み込み・デコードをスレッドで先行させて解析と重ねる
+            return iter_pipelined_results(file_paths, config, lookup, pipeline_metrics)
+        return iter_sequential_results(file_paths, config, lookup)
+
+    def iter_sharded_results():
+        # 先読みで待ちが始まらないよう、リースのないシャードの引き継ぎは前のファイルの結果を全て処理してから始める
+        yield from iter_results(wav_files)
+        yield from iter_results(shard_run.iter_unstarted_files(walk))
+
+    results = iter_results(wav_files) if shard_run is None else iter_sharded_results()
+
+    # ファイルごとの結果の列形式での書き出し
+    result_writer = open_result_writer(config, logger)
+
+    file_count = 0
+    instance_snapshots = []
+    for result in results:
+        file_path = result['file_path']
+        # 最初のファイル以外は前に空行を追加
+        if test_mode and file_count > 0:
+            print()  # ファイル間の空行
+        file_count += 1
+        if test_mode:
+            rel_path = os.path.relpath(file_path, directory_path)
+            print(f"{rel_path} | ", end='')
+        print(result['output'], end='')
+
+        if shard_run is not None:
+            shard_run.record(file_path, result)
+        if result['error'] is not None:
+            logger.error(f"Error processing {file_path}: {result['error']}")
+        else:
+            # リネームでパスが変わる前に記録する
+            if manifest is not None and not result.get('from_manifest'):
+                manifest.record(file_path, result['judgment'], result['stats'], result['output'])
+            if renamer is not None:
+                renamer.submit(file_path, result['judgment'])
+
+        # マニフェストの結果とタイムアウトしたファイルは計測結果がない
+        if result['profile'] is not None:
+            report.add(result['profile'], result['pstats_data'])
+        if result.get('instance_counts') is not None:
+            instance_snapshots.append(result['instance_counts'])
+        if result_writer is not None:
+            result_writer.add(result)
+
+    if manifest is not None:
+        manifest.close()
+    if shard_run is not None:
+        for processed_shard, count in sorted(shard_run.close().items()):
+            logger.info(f"Shard {processed_shard}/{shard[1]}: processed {count} files")
+    if result_writer is not None:
+        rows = result_writer.close()
+        logger.info(f"Exported {rows} results to {result_writer.path}")
+
+    if renamer is not None:
+        planned = renamer.close()
+        if plan_mode:
+            logger.info("\n" + "=" * 80)
+            logger.info(f"PLAN - {len(planned)} files would be renamed ({renamer.skipped} skipped to avoid overwrite)")
+            for file_path, new_file_path in planned:
+                print(f"{file_path} -> {new_file_path}")
+        else:
+            logger.info(f"Renamed {renamer.renamed} files ({renamer.skipped} skipped to avoid overwrite).")
 
     logger.info("\n" + "=" * 80)
+    logger.info(f"Found {file_count} wav files with '_MLD' in name.")
+    for line in report.summary_lines():
+        logger.info(line)
+    for line in summarize_instance_counts(instance_snapshots):
+        logger.info(line)
+    if pipeline_metrics is not None:
+        for line in pipeline_metrics.summary_lines():
+            logger.info(line)
+    dumped = report.close()
+    if dumped:
+        logger.info(f"Saved cProfile results of the {dumped} slowest files to {report.profile_dir}/")
     logger.info("Processing completed.")
 
 if __name__ == "__main__":
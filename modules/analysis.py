@@ -0,0 +1,117 @@
+# modules/analysis.py
+
+import os
+import io
+
+from .audio_processor import load_and_preprocess_audio
+from .feature_extractor import extract_features
+from .frame_volume import compute_frame_volumes
+from .judge import judge_chord_or_melody
+from .stream_analysis import use_streaming, judge_streaming
+from .profiler import stage, set_audio_duration
+
+def get_features(file_path, config, cache=None):
+    """
+    ファイルの特徴量（ピッチとフレームごとの音量）を取得
+    キャッシュにあれば読み込み・多ピッチ推定を省略する
+    Returns:
+        tuple: (pitches, frame_volumes)
+    """
+    if cache is not None:
+        with stage('cache_load'):
+            cached = cache.load(file_path)
+        if cached is not None:
+            return cached
+
+    # オーディオファイルの読み込みと前処理
+    y, sr = load_and_preprocess_audio(file_path, config)
+    return _extract(file_path, y, sr, config, cache)
+
+def _extract(file_path, y, sr, config, cache=None):
+    """
+    信号から特徴量を抽出し、キャッシュに保存する
+    """
+    # 特徴量抽出
+    pitches = extract_features(y, sr, config)
+    # フレーム音量はピッチと同じフレーム位置・フレーム数で計算する
+    with stage('frame_volume'):
+        frame_volumes = compute_frame_volumes(y, config, len(pitches))
+
+    if cache is not None:
+        with stage('cache_store'):
+            cache.store(file_path, pitches, frame_volumes)
+
+    return pitches, frame_volumes
+
+def read_source(file_path, max_bytes):
+    """
+    読み込み段階: max_bytes以下のファイルはメモリに読み込み、ファイルオブジェクトとして返す
+    （それより大きいファイルはパスのまま返し、解析時に読み込む）
+    """
+    if os.path.getsize(file_path) > max_bytes:
+        return file_path
+    with stage('read'):
+        with open(file_path, 'rb') as f:
+            return io.BytesIO(f.read())
+
+def prepare_file(file_path, config, cache=None, source=None):
+    """
+    解析の前段（キャッシュの読み込み・デコード）を行う
+    source: read_sourceで先読みした内容（Noneならパスから読む）
+    Returns:
+        tuple: (kind, data)
+            ('stream', source)      ストリーミング解析するファイル
+            ('early_exit', source)  早期打ち切りありでウィンドウ単位に解析するファイル
+            ('features', (pitches, frame_volumes))  キャッシュから読み込んだ特徴量
+            ('audio', (y, sr))      デコード・正規化済みの信号
+    """
+    if source is None:
+        source = file_path
+    if use_streaming(file_path, config):
+        return 'stream', source
+
+    cached = None
+    if cache is not None:
+        with stage('cache_load'):
+            cached = cache.load(file_path)
+    if cached is not None:
+        return 'features', cached
+    if not config.get('full_analysis', True):
+        return 'early_exit', source
+    return 'audio', load_and_preprocess_audio(source, config)
+
+def judge_prepared(file_path, prepared, config, cache=None):
+    """
+    prepare_fileの結果から特徴量抽出・判定を行う
+    Returns:
+        tuple: (judgment, stats)
+    """
+    kind, data = prepared
+    early_exit = not config.get('full_analysis', True)
+    if kind == 'stream':
+        return judge_streaming(data, config, early_exit=early_exit)
+    if kind == 'early_exit':
+        return judge_streaming(
+            data, config, window_sec=config.get('early_exit_window_sec', 10), early_exit=True
+        )
+
+    if kind == 'features':
+        pitches, frame_volumes = data
+        # キャッシュから読んだ場合はフレーム数から音声の長さを求める
+        set_audio_duration((len(frame_volumes) - 1) * config.get('hop_size', 512) / (config.get('sample_rate') or 44100))
+    else:
+        y, sr = data
+        pitches, frame_volumes = _extract(file_path, y, sr, config, cache)
+    return judge_chord_or_melody(frame_volumes, pitches, config)
+
+def judge_file(file_path, config, cache=None):
+    """
+    1ファイルの特徴量取得から判定までを行う
+    Returns:
+        tuple: (judgment, stats)
+    - 長いファイルはストリーミング解析で処理する
+    - full_analysisでない場合（--early-exit）、キャッシュにないファイルは短いウィンドウ単位で解析し、
+      判定が確定した時点で打ち切る（統計情報は途中までの値になり、ウィンドウ単位の多ピッチ推定のため
+      全フレーム解析の判定と異なる場合がある。特徴量キャッシュには保存しない）
+    """
+    return judge_prepared(file_path, prepare_file(file_path, config, cache), config, cache)
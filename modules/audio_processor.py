@@ -1,14 +1,91 @@
 # modules/audio_processor.py
 
+import threading
+
 import librosa
 import numpy as np
+import soundfile as sf
+
+from .profiler import stage, set_audio_duration
+
+def decode_audio(file_path, sample_rate=None, resample_type='soxr_hq', scratch_max_mb=None):
+    """
+    オーディオファイルをモノラルのfloat32として読み込む
+    - ヘッダーを先に読み、サンプリングレートが異なる場合だけリサンプルする
+    - soundfileで読めない形式はlibrosa.loadで読み込む
+    file_path: パス、または先読みした内容のファイルオブジェクト
+    scratch_max_mb: 複数チャンネルの読み込みに使い回すバッファの上限（MB、メモリの予算がある場合のみ。Noneなら毎回確保する）
+    """
+    try:
+        info = sf.info(file_path)
+    except RuntimeError:
+        _rewind(file_path)
+        return librosa.load(file_path, sr=sample_rate, res_type=resample_type)
+
+    # float32のまま直接デコード（複数チャンネルは平均してモノラルにする）
+    _rewind(file_path)
+    if info.channels > 1:
+        # メモリの予算がある場合は予算内の大きさのバッファをファイル間で使い回し、確保し直しによる断片化を防ぐ
+        out = None
+        if scratch_max_mb and info.frames * info.channels * 4 <= scratch_max_mb * 1024 * 1024:
+            out = _scratch_buffer(info.frames, info.channels)
+        frames, sr = sf.read(file_path, dtype='float32', always_2d=True, out=out)
+        y = frames.mean(axis=1, dtype=np.float32)
+        del frames
+    else:
+        y, sr = sf.read(file_path, dtype='float32')
+
+    if sample_rate and sr != sample_rate:
+        y = librosa.resample(y, orig_sr=sr, target_sr=sample_rate, res_type=resample_type)
+        sr = sample_rate
+    return y, sr
+
+# スレッドごとの読み込み用バッファ（メモリの予算がある場合に、複数チャンネルのファイルのデコードでファイル間で使い回す）
+# 大きさは1ファイルの予算までなので、スレッドごとに最大でその分を保持し続ける
+_scratch = threading.local()
+
+def _scratch_buffer(frames, channels):
+    """
+    (frames, channels) のfloat32バッファを返す（足りなければ確保し直す）
+    返した信号から参照されないため、次のファイルで上書きしてよい
+    """
+    buffer = getattr(_scratch, 'buffer', None)
+    if buffer is None or buffer.shape[0] < frames or buffer.shape[1] != channels:
+        buffer = np.empty((frames, channels), dtype=np.float32)
+        _scratch.buffer = buffer
+    return buffer[:frames]
+
+def normalize_in_place(y):
+    """
+    ピーク値で正規化する（librosa.util.normalizeと同じ結果をコピーを作らずに求める）
+    - 割り算はfloat64で行いfloat32に丸める（ufuncのバッファ単位で変換するため全長の一時配列は作らない）
+    - ピーク値が極めて小さい場合はそのまま返す
+    """
+    if len(y) == 0:
+        return y
+    peak = max(float(y.max()), -float(y.min()))
+    if not np.isfinite(peak):
+        raise ValueError("Input must be finite")
+    if peak >= np.finfo(y.dtype).tiny:
+        np.divide(y, peak, out=y, dtype=np.float64, casting='unsafe')
+    return y
+
+def _rewind(source):
+    # ファイルオブジェクトはヘッダーを読んだ位置から先頭に戻す
+    if hasattr(source, 'seek'):
+        source.seek(0)
 
 def load_and_preprocess_audio(file_path, config):
     # サンプリングレートの取得
     sample_rate = config.get('sample_rate', None)
     # オーディオの読み込み
-    y, sr = librosa.load(file_path, sr=sample_rate)
+    with stage('decode'):
+        y, sr = decode_audio(
+            file_path, sample_rate, config.get('resample_type', 'soxr_hq'), config.get('file_memory_budget_mb', None)
+        )
+    set_audio_duration(len(y) / sr)
     # 正規化
     if config.get('normalize', True):
-        y = librosa.util.normalize(y)
-    return y, sr
\ No newline at end of file
+        with stage('normalize'):
+            y = normalize_in_place(y)
+    return y, sr
@@ -0,0 +1,171 @@
+# modules/batch_runner.py
+
+import io
+import contextlib
+import collections
+import multiprocessing
+
+import numpy as np
+import librosa
+
+from .analysis import judge_file, judge_prepared
+from .audio_processor import normalize_in_place
+from .feature_cache import open_feature_cache
+from .feature_extractor import get_multi_pitch
+from .judgment_methods.factory import get_judgment_method
+from .profiler import FileProfile, merge_records
+from .instance_pool import instance_counts
+from .result_export import capture_frames
+
+# ワーカー1つあたりの先読み件数（投入済みで結果を返していないファイル数の上限）
+PREFETCH_PER_WORKER = 4
+
+# ワーカープロセスごとに保持する設定と特徴量キャッシュ
+_worker_config = None
+_worker_cache = None
+
+def _init_worker(config):
+    """
+    ワーカープロセスの初期化
+    Essentia/librosaのオブジェクトはここで1度だけ構築し、以降のファイルで使い回す
+    """
+    global _worker_config, _worker_cache
+    _worker_config = config
+    _worker_cache = open_feature_cache(config)
+
+    sample_rate = config.get('sample_rate', None)
+    if sample_rate:
+        # 多ピッチ推定器・判定方式を事前に構築
+        get_multi_pitch(sample_rate, config)
+        get_judgment_method(config.get('judgment_method', 'two_stage'))
+        # librosaのリサンプル・正規化処理を一度通して初回呼び出しのコストを済ませておく
+        dummy = np.zeros(2048, dtype=np.float32)
+        librosa.resample(dummy, orig_sr=48000, target_sr=sample_rate, res_type=config.get('resample_type', 'soxr_hq'))
+        normalize_in_place(dummy)
+
+def process_file(file_path, config, cache=None, prepared=None, prepare_record=None):
+    """
+    1ファイル分の解析（読み込み→特徴量抽出→判定）を行い、結果をまとめて返す
+    判定結果の出力は捕捉して結果に含める
+    prepared: パイプラインの前段（analysis.prepare_file）の結果。Noneなら読み込みから行う
+    prepare_record: 前段の計測結果（このファイルの計測結果に合算する）
+    """
+    output = io.StringIO()
+    profile = FileProfile(file_path, use_cprofile=config.get('profile_top_n', 0) > 0)
+    try:
+        with contextlib.redirect_stdout(output), profile, \
+                capture_frames(config.get('result_export_frames', False)) as frames:
+            if prepared is None:
+                judgment, stats = judge_file(file_path, config, cache)
+            else:
+                judgment, stats = judge_prepared(file_path, prepared, config, cache)
+        if prepare_record is not None:
+            merge_records(profile.record, prepare_record)
+        return {
+            'file_path': file_path,
+            'judgment': judgment,
+            'stats': stats,
+            'output': output.getvalue(),
+            'profile': profile.record,
+            'pstats_data': profile.pstats_data,
+            'instance_counts': instance_counts(),
+            'frames': frames.arrays() if frames is not None else None,
+            'error': None,
+        }
+    except Exception as e:
+        return _error_result(file_path, str(e), output.getvalue(), profile.record)
+
+def _error_result(file_path, message, output='', profile_record=None):
+    return {
+        'file_path': file_path,
+        'judgment': None,
+        'stats': None,
+        'output': output,
+        'profile': profile_record,
+        'pstats_data': None,
+        'error': message,
+    }
+
+def _process_in_worker(file_path):
+    return process_file(file_path, _worker_config, _worker_cache)
+
+def iter_sequential_results(file_paths, config, lookup=None):
+    """
+    ファイルを1つずつ処理し、結果を入力順に返す
+    lookupが結果を返したファイルは処理せずその結果を返す
+    """
+    cache = open_feature_cache(config)
+    for file_path in file_paths:
+        result = lookup(file_path) if lookup is not None else None
+        if result is None:
+            result = process_file(file_path, config, cache)
+        yield result
+
+def _create_pool(config, workers):
+    # fork後のスレッド・Essentia内部状態の引き継ぎを避けるためspawnで起動する
+    context = multiprocessing.get_context('spawn')
+    return context.Pool(workers, initializer=_init_worker, initargs=(config,))
+
+def iter_batch_results(file_paths, config, workers, lookup=None):
+    """
+    プロセスプールでファイルを並列処理し、結果を入力順に返す
+    - file_pathsはイテレータでもよく、先読みしながら投入する（探索と解析を並行させる）
+    - lookupが結果を返したファイルは処理せずその結果を返す
+    - 1ファイルの例外は結果のerrorとして返す
+    - ワーカーのハング・クラッシュはタイムアウトで検出し、プールを作り直して残りを継続する
+    """
+    file_paths = iter(file_paths)
+    timeout = config.get('file_timeout_sec', 600)
+    window = workers * PREFETCH_PER_WORKER
+
+    # [file_path, 結果, AsyncResult] の入力順のキュー（結果が決まっているものはAsyncResultがNone）
+    queued = collections.deque()
+    pool = None
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and len(queued) < window:
+                file_path = next(file_paths, None)
+                if file_path is None:
+                    exhausted = True
+                    break
+                result = lookup(file_path) if lookup is not None else None
+                if result is not None:
+                    queued.append([file_path, result, None])
+                    continue
+                if pool is None:
+                    pool = _create_pool(config, workers)
+                queued.append([file_path, None, pool.apply_async(_process_in_worker, (file_path,))])
+
+            if not queued:
+                break
+
+            file_path, result, async_result = queued.popleft()
+            if async_result is not None:
+                try:
+                    result = async_result.get(timeout)
+                except multiprocessing.TimeoutError:
+                    result = _error_result(
+                        file_path, f"Timed out after {timeout}s (worker hung or crashed)"
+                    )
+                    # 完了済みの結果は保持し、未完了のものは新しいプールで再実行する
+                    for entry in queued:
+                        if entry[2] is not None and entry[2].ready():
+                            try:
+                                entry[1] = entry[2].get(0)
+                            except Exception as e:
+                                entry[1] = _error_result(entry[0], str(e))
+                            entry[2] = None
+                    pool.terminate()
+                    pool.join()
+                    pool = _create_pool(config, workers)
+                    for entry in queued:
+                        if entry[2] is not None:
+                            entry[2] = pool.apply_async(_process_in_worker, (entry[0],))
+                except Exception as e:
+                    result = _error_result(file_path, str(e))
+            yield result
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
@@ -0,0 +1,175 @@
+# modules/feature_cache.py
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+
+import numpy as np
+
+from .pitch_matrix import PitchFrames
+
+# キャッシュ形式を変更した場合はこの値を上げる（古いエントリは自動的に使われなくなる）
+CACHE_FORMAT_VERSION = 3
+
+# キャッシュキーに含める抽出パラメータ
+EXTRACTION_PARAMS = ('sample_rate', 'hop_size', 'min_frequency', 'max_frequency', 'normalize')
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+def open_feature_cache(config):
+    """
+    設定に従って特徴量キャッシュを開く
+    キャッシュが無効な場合はNoneを返す
+    """
+    if not config.get('feature_cache_enabled', True):
+        return None
+    return FeatureCache(
+        config.get('feature_cache_dir', '.feature_cache'),
+        config.get('feature_cache_max_mb', 2048) * 1024 * 1024,
+        extraction_params_key(config),
+        rebuild=config.get('feature_cache_rebuild', False),
+    )
+
+def extraction_params_key(config):
+    """
+    抽出パラメータからキャッシュキーの一部となるハッシュ値を作成
+    """
+    params = {name: config.get(name) for name in EXTRACTION_PARAMS}
+    params['version'] = CACHE_FORMAT_VERSION
+    encoded = json.dumps(params, sort_keys=True).encode('utf-8')
+    return hashlib.sha1(encoded).hexdigest()
+
+def hash_file_content(file_path):
+    """
+    ファイル内容のハッシュ値を計算
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class FeatureCache:
+    """
+    フレームごとのピッチ（PitchFrames）と音量を保存するディスクキャッシュ
+    - キー: ファイル内容のハッシュ + 抽出パラメータ
+    - サイズ・mtime・inodeが一致するファイルは内容ハッシュの再計算を省略する
+    - 合計サイズが上限を超えたら最終アクセスの古いものから削除する（LRU）
+    """
+    def __init__(self, cache_dir, max_bytes, params_key, rebuild=False):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.params_key = params_key
+        self.rebuild = rebuild
+        os.makedirs(cache_dir, exist_ok=True)
+
+        # 複数ワーカーから同時に使われるためタイムアウトを長めにとる
+        self.db = sqlite3.connect(os.path.join(cache_dir, 'index.sqlite'), timeout=60)
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS files ('
+            'path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, inode INTEGER, content_hash TEXT)'
+        )
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            'key TEXT PRIMARY KEY, size_bytes INTEGER, last_access REAL)'
+        )
+        self.db.commit()
+
+    def _content_hash(self, file_path):
+        """
+        ファイル内容のハッシュ値を取得（stat情報が変わっていなければ記録済みの値を使う）
+        """
+        path = os.path.abspath(file_path)
+        st = os.stat(path)
+        row = self.db.execute(
+            'SELECT size, mtime_ns, inode, content_hash FROM files WHERE path = ?', (path,)
+        ).fetchone()
+        if row is not None and tuple(row[:3]) == (st.st_size, st.st_mtime_ns, st.st_ino):
+            return row[3]
+
+        content_hash = hash_file_content(path)
+        self.db.execute(
+            'INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)',
+            (path, st.st_size, st.st_mtime_ns, st.st_ino, content_hash)
+        )
+        self.db.commit()
+        return content_hash
+
+    def _entry_key(self, file_path):
+        return hashlib.sha1(
+            (self._content_hash(file_path) + self.params_key).encode('utf-8')
+        ).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + '.npz')
+
+    def load(self, file_path):
+        """
+        キャッシュ済みの特徴量を取得
+        Returns:
+            tuple: (pitches, frame_volumes) または None
+        """
+        if self.rebuild:
+            return None
+
+        key = self._entry_key(file_path)
+        entry_path = self._entry_path(key)
+        try:
+            with np.load(entry_path) as data:
+                pitches = PitchFrames.from_packed_notes(data['note_values'], data['note_offsets'])
+                frame_volumes = data['frame_volumes']
+        except (OSError, KeyError, ValueError):
+            return None
+
+        self.db.execute('UPDATE entries SET last_access = ? WHERE key = ?', (time.time(), key))
+        self.db.commit()
+        return pitches, frame_volumes
+
+    def store(self, file_path, pitches, frame_volumes):
+        """
+        特徴量をキャッシュに保存し、必要に応じて古いエントリを削除する
+        """
+        key = self._entry_key(file_path)
+        entry_path = self._entry_path(key)
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+
+        values, offsets = PitchFrames.from_hz(pitches).pack()
+        # 書き込み途中のファイルを読まれないよう一時ファイル経由で置き換える
+        tmp_path = f"{entry_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(
+                f,
+                note_values=values,
+                note_offsets=offsets,
+                frame_volumes=np.asarray(frame_volumes, dtype=np.float64),
+            )
+        os.replace(tmp_path, entry_path)
+
+        self.db.execute(
+            'INSERT OR REPLACE INTO entries VALUES (?, ?, ?)',
+            (key, os.path.getsize(entry_path), time.time())
+        )
+        self.db.commit()
+        self._evict()
+
+    def _evict(self):
+        """
+        合計サイズが上限以下になるまで最終アクセスの古いエントリを削除
+        """
+        total = self.db.execute('SELECT COALESCE(SUM(size_bytes), 0) FROM entries').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        rows = self.db.execute('SELECT key, size_bytes FROM entries ORDER BY last_access').fetchall()
+        for key, size_bytes in rows:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(self._entry_path(key))
+            except FileNotFoundError:
+                pass
+            self.db.execute('DELETE FROM entries WHERE key = ?', (key,))
+            total -= size_bytes
+        self.db.commit()
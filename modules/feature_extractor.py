@@ -3,20 +3,42 @@
 import essentia.standard as ess
 import numpy as np
 
-def extract_features(y, sr, config):
-    # 多ピッチ推定のパラメータ取得
-    hop_size = config.get('hop_size', 512)
-    min_frequency = config.get('min_frequency', 50)
-    max_frequency = config.get('max_frequency', 5000)
+from .profiler import stage
+from .instance_pool import InstancePool
+from .pitch_matrix import PitchFrames
 
+def _create_multi_pitch(sr, hop_size, min_frequency, max_frequency):
     # 多ピッチ推定器の初期化
-    multi_pitch = ess.MultiPitchMelodia(
+    return ess.MultiPitchMelodia(
         hopSize=hop_size,
         sampleRate=sr,
         minFrequency=min_frequency,
         maxFrequency=max_frequency
     )
 
+# 多ピッチ推定器のプール（プロセス・スレッドごとに構築済みのものを使い回す）
+_multi_pitch_pool = InstancePool('multipitch', _create_multi_pitch)
+
+def get_multi_pitch(sr, config):
+    """
+    パラメータごとに構築済みの多ピッチ推定器を返す
+    """
+    # 多ピッチ推定のパラメータ取得
+    hop_size = config.get('hop_size', 512)
+    min_frequency = config.get('min_frequency', 50)
+    max_frequency = config.get('max_frequency', 5000)
+    return _multi_pitch_pool.get((sr, hop_size, min_frequency, max_frequency))
+
+def extract_features(y, sr, config):
+    """
+    多ピッチ推定を行い、フレームごとのピッチをPitchFrames（MIDIノート番号）で返す
+    """
+    multi_pitch = get_multi_pitch(sr, config)
+    # 使い回す推定器は前回の内部状態をリセットしてから使う
+    multi_pitch.reset()
+
     # 多ピッチ推定の実行
-    pitches = multi_pitch(y)
-    return pitches
\ No newline at end of file
+    with stage('multipitch'):
+        pitches = multi_pitch(y)
+    # Hz→MIDIの変換はここで1度だけ行い、以降は全ての判定方式で共有する
+    return PitchFrames.from_hz(pitches)
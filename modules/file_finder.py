@@ -1,11 +1,81 @@
 # modules/file_finder.py
 
 import os
+import heapq
+import concurrent.futures
 
-def find_wav_files(directory_path):
-    wav_files = []
-    for root, dirs, files in os.walk(directory_path):
-        for file in files:
-            if file.lower().endswith('.wav'):
-                wav_files.append(os.path.join(root, file))
-    return wav_files
\ No newline at end of file
+def is_target_wav(file_name):
+    """
+    拡張子が.wavで、ファイル名（拡張子を除く）に"_MLD"が含まれるか
+    """
+    return file_name.lower().endswith('.wav') and "_MLD" in os.path.splitext(file_name)[0]
+
+def list_directory(path):
+    """
+    1ディレクトリ分の対象WAVファイル名とサブディレクトリ名を取得する
+    （os.walkと同様に、シンボリックリンクのディレクトリはたどらない）
+    Returns:
+        tuple: (ファイル名のリスト, サブディレクトリ名のリスト)
+    """
+    file_names = []
+    subdir_names = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if is_dir:
+                if not entry.is_symlink():
+                    subdir_names.append(entry.name)
+            elif is_target_wav(entry.name):
+                file_names.append(entry.name)
+    return file_names, subdir_names
+
+def hierarchy_key(path):
+    """
+    iter_wav_filesが返す順（ディレクトリ→ファイル名の昇順）の並べ替えキー
+    同じディレクトリからの相対パスどうしでも比較できる
+    """
+    return os.path.dirname(path), os.path.basename(path)
+
+def _list_or_empty(list_function, path):
+    # os.walkと同様に、読めないディレクトリは無視する
+    try:
+        return list_function(path)
+    except OSError:
+        return [], []
+
+def iter_wav_files(directory, threads=8, list_function=list_directory):
+    """
+    条件に合うWAVファイルを探索し、見つかった順に階層順（ディレクトリ→ファイル名の昇順）で返す
+    - 複数のディレクトリをスレッドで並行して一覧する
+    - 一覧済みのディレクトリは、それより前に並ぶディレクトリが全て一覧済みになった時点で返す
+      （未一覧のディレクトリの子孫のパスは、そのディレクトリのパスより後ろに並ぶ）
+    """
+    listed = []    # (ディレクトリのパス, ファイル名のリスト) の最小ヒープ
+    pending = {}   # 一覧中のディレクトリのパス → Future
+    pending_order = []  # 一覧中のディレクトリのパスの最小ヒープ（一覧済みのものは遅延削除）
+
+    with concurrent.futures.ThreadPoolExecutor(max(threads, 1)) as executor:
+        def submit(path):
+            pending[path] = executor.submit(_list_or_empty, list_function, path)
+            heapq.heappush(pending_order, path)
+
+        submit(directory)
+        while pending:
+            done, _ = concurrent.futures.wait(
+                pending.values(), return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for path in [path for path, future in pending.items() if future in done]:
+                file_names, subdir_names = pending.pop(path).result()
+                heapq.heappush(listed, (path, sorted(file_names)))
+                for name in subdir_names:
+                    submit(os.path.join(path, name))
+
+            while pending_order and pending_order[0] not in pending:
+                heapq.heappop(pending_order)
+            while listed and (not pending_order or listed[0][0] < pending_order[0]):
+                path, file_names = heapq.heappop(listed)
+                for name in file_names:
+                    yield os.path.join(path, name)
@@ -0,0 +1,61 @@
+# modules/frame_volume.py
+
+import numpy as np
+
+def multipitch_frame_count(num_samples, hop_size):
+    """
+    MultiPitchMelodiaが出力するフレーム数（フレームiはi*hop_sizeを中心とする）
+    """
+    return -(-num_samples // hop_size) + 1
+
+def frame_mean_squares(y, hop_size, n_frames=None):
+    """
+    フレームごとの二乗平均を計算
+    フレームiはi*hop_sizeを中心とする長さhop_sizeの区間で、信号の範囲外は0とみなす
+    信号の内側に収まるフレームはコピーせずに(フレーム数, hop_size)のビューとして一度に計算する
+    """
+    num_samples = len(y)
+    if n_frames is None:
+        n_frames = multipitch_frame_count(num_samples, hop_size)
+
+    half = hop_size // 2
+    mean_squares = np.zeros(n_frames, dtype=np.float64)
+
+    # 信号の内側に完全に収まるフレームの範囲 [first, last)
+    first = -(-half // hop_size)
+    last = min(n_frames, (num_samples + half - hop_size) // hop_size + 1)
+    if last > first:
+        start = first * hop_size - half
+        frames = y[start:start + (last - first) * hop_size].reshape(last - first, hop_size)
+        mean_squares[first:last] = np.einsum('ij,ij->i', frames, frames, dtype=np.float64) / hop_size
+
+    # 信号の端にかかるフレームは範囲内の部分だけで計算する
+    for i in list(range(0, min(first, n_frames))) + list(range(max(last, first), n_frames)):
+        frame = y[max(i * hop_size - half, 0):max(i * hop_size - half + hop_size, 0)]
+        if len(frame) > 0:
+            mean_squares[i] = np.dot(frame, frame) / hop_size
+
+    return mean_squares
+
+def compute_frame_volumes(y, config, n_frames=None):
+    """
+    フレームごとの音量（dB）を計算
+    n_frames: フレーム数（省略時はMultiPitchMelodiaのフレーム数に合わせる）
+    """
+    hop_size = config.get('hop_size', 512)
+    mean_squares = frame_mean_squares(y, hop_size, n_frames)
+    return 20 * np.log10(np.sqrt(mean_squares) + 1e-10)
+
+def volume_gate(frame_volumes, config):
+    """
+    音量が分析対象の範囲にあるフレームのマスクを作成
+    - min_volume_threshold_db: この値以下のフレームは分析対象外
+    - max_volume_threshold_db: この値より大きいフレームは分析対象外（未設定なら上限なし）
+    """
+    min_volume_threshold_db = config.get('min_volume_threshold_db', -24)
+    max_volume_threshold_db = config.get('max_volume_threshold_db', None)
+
+    volume_mask = frame_volumes > min_volume_threshold_db
+    if max_volume_threshold_db is not None:
+        volume_mask &= frame_volumes <= max_volume_threshold_db
+    return volume_mask
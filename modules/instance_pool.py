@@ -0,0 +1,69 @@
+# modules/instance_pool.py
+
+import os
+import threading
+import collections
+
+# 種類ごとの構築・再利用の回数（プロセス内で共有）
+_counts = collections.Counter()
+_counts_lock = threading.Lock()
+
+class InstancePool:
+    """
+    パラメータのキーごとに構築済みのインスタンスを保持して使い回す
+    Essentiaのアルゴリズムは内部状態を持つため、スレッドごとに別のインスタンスを保持する
+    """
+    def __init__(self, name, factory):
+        self.name = name
+        self.factory = factory
+        self._local = threading.local()
+
+    def get(self, key):
+        instances = getattr(self._local, 'instances', None)
+        if instances is None:
+            instances = self._local.instances = {}
+
+        instance = instances.get(key)
+        if instance is None:
+            instance = instances[key] = self.factory(*key)
+            _count(self.name, 'constructed')
+        else:
+            _count(self.name, 'reused')
+        return instance
+
+def _count(name, event):
+    with _counts_lock:
+        _counts[(name, event)] += 1
+
+def instance_counts():
+    """
+    プロセス内の構築・再利用の回数
+    Returns:
+        dict: {'pid': プロセスID, 'counts': {種類: {'constructed': 回数, 'reused': 回数}}}
+    """
+    counts = {}
+    with _counts_lock:
+        for (name, event), value in _counts.items():
+            counts.setdefault(name, {'constructed': 0, 'reused': 0})[event] = value
+    return {'pid': os.getpid(), 'counts': counts}
+
+def summarize_instance_counts(snapshots):
+    """
+    プロセスごとの最新の回数を合計した集計結果の行
+    """
+    latest = {}
+    for snapshot in snapshots:
+        latest[snapshot['pid']] = snapshot['counts']
+
+    totals = {}
+    for counts in latest.values():
+        for name, events in counts.items():
+            total = totals.setdefault(name, {'constructed': 0, 'reused': 0})
+            for event, value in events.items():
+                total[event] += value
+
+    return [
+        f"Instances [{name}]: constructed {total['constructed']}, reused {total['reused']} "
+        f"({len(latest)} processes)"
+        for name, total in sorted(totals.items())
+    ]
@@ -1,19 +1,35 @@
 # modules/judge.py
 
 import numpy as np
-from .judgment_methods.factory import create_judgment_method
+from .judgment_methods.factory import get_judgment_method
+from .pitch_matrix import PitchFrames
+from .frame_volume import volume_gate
+from .profiler import stage
+from .result_export import record_frames
 
-def judge_chord_or_melody(y, pitches, config):
+def judge_chord_or_melody(frame_volumes, pitches, config):
     """
     音声信号全体の判定を行う
+    frame_volumes: frame_volume.compute_frame_volumesで計算したフレームごとの音量（dB）
+    Returns:
+        tuple: (judgment, stats)
     """
     # 判定方式の取得
     method_name = config.get('judgment_method', 'two_stage')
-    judgment_method = create_judgment_method(method_name)
+    judgment_method = get_judgment_method(method_name)
     
     # フレームタイプの分析
-    frame_types, stats = analyze_frame_types(y, pitches, config, judgment_method)
+    with stage('frame_analysis'):
+        frame_types, stats = analyze_frame_types(frame_volumes, pitches, config, judgment_method)
     
+    return report_judgment(judgment_method, stats, config)
+
+def report_judgment(judgment_method, stats, config):
+    """
+    統計情報から最終判定を行い、結果を出力する
+    Returns:
+        tuple: (judgment, stats)
+    """
     # 判定
     analyzed_frames = stats['total_frames'] - stats['skip_frames']
     judgment = judgment_method.make_judgment(stats, analyzed_frames, config)
@@ -21,37 +37,30 @@ def judge_chord_or_melody(y, pitches, config):
     # 結果の出力（シンプルに）
     print(f"{judgment.upper()}")
     print(judgment_method.format_stats(stats, stats['total_frames']))
+    if stats.get('unanalyzed_frames'):
+        # 判定が確定した時点で解析を打ち切った場合
+        print(f"Early Exit: {stats['unanalyzed_frames']} frames not analyzed")
     
-    return judgment
+    return judgment, stats
 
-def analyze_frame_types(y, pitches, config, judgment_method):
+def analyze_frame_types(frame_volumes, pitches, config, judgment_method):
     """
     フレームごとの分析を行う
     """
-    # 音量に基づくフレームの有効性判定
-    hop_size = config.get('hop_size', 512)
-    min_volume_threshold_db = config.get('min_volume_threshold_db', -24)
+    frame_volumes = np.asarray(frame_volumes)
+    max_volume = frame_volumes.max() if len(frame_volumes) > 0 else float('-inf')
     
-    # フレームごとの音量を計算
-    frame_volumes = []
-    max_volume = float('-inf')
-    
-    for i in range(0, len(y), hop_size):
-        frame = y[i:i + hop_size]
-        if len(frame) == hop_size:
-            volume = 20 * np.log10(np.sqrt(np.mean(frame**2)) + 1e-10)
-            frame_volumes.append(volume)
-            max_volume = max(max_volume, volume)
-    
-    # 音量マスクの作成
-    volume_mask = np.array(frame_volumes) > min_volume_threshold_db
+    # 音量に基づくフレームの有効性判定
+    volume_mask = volume_gate(frame_volumes, config)
     total_frames = len(frame_volumes)
     
     # 有効なフレームを抽出
     valid_frames = np.where(volume_mask)[0]
     
-    # 判定方式によるフレーム分析
-    frame_types, method_stats = judgment_method.analyze_frames(valid_frames, pitches, config)
+    # 判定方式によるフレーム分析（Hzのピッチ列が渡された場合はPitchFramesに変換してから渡す）
+    pitch_frames = PitchFrames.from_hz(pitches)
+    frame_types, method_stats = judgment_method.analyze_frames(valid_frames, pitch_frames, config)
+    record_frames(frame_volumes, pitch_frames, valid_frames, frame_types)
     
     # 基本統計情報
     stats = {
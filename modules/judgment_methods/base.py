@@ -1,13 +1,33 @@
+import numpy as np
+
+# frame_typesの値
+FRAME_MELODY = 0
+FRAME_CHORD = 1
+
 class JudgmentMethod:
     """
     判定方式の基本クラス
     全ての判定方式はこのクラスを継承する
     """
+    # analyze_framesが参照する設定名（スイープでフレーム分析の結果を使い回す単位になる）
+    frame_params = ()
+
     def analyze_frames(self, valid_frames, pitches, config):
         """
         フレーム分析を行う
+        pitches: ファイル全体のPitchFrames（MIDIノート番号）。valid_framesで分析対象のフレームを選ぶ
         Returns:
             tuple: (frame_types, stats)
+                frame_types: FRAME_MELODY / FRAME_CHORD のint8配列
+        """
+        raise NotImplementedError
+        
+    def chord_conditions(self, stats, config):
+        """
+        和音と判定する条件の一覧
+        Returns:
+            list: (フレーム数, 比率の閾値) のリスト
+                  いずれかのフレーム数の比率が閾値以上なら和音と判定する
         """
         raise NotImplementedError
         
@@ -17,7 +37,62 @@ class JudgmentMethod:
         Returns:
             str: 'chord' or 'melody'
         """
-        raise NotImplementedError
+        if analyzed_frames == 0:
+            return 'melody'
+        
+        is_chord = any(
+            frames / analyzed_frames >= threshold
+            for frames, threshold in self.chord_conditions(stats, config)
+        )
+        
+        return 'chord' if is_chord else 'melody'
+        
+    def decided_judgment(self, stats, remaining_frames, config):
+        """
+        途中までの統計情報から、残りのフレームによらず判定が確定しているかを調べる
+        stats: merge_statsで合算した途中までの統計情報
+        remaining_frames: まだ分析していないフレーム数（音量判定前）
+        Returns:
+            str: 確定していれば 'chord' or 'melody'、未確定ならNone
+        """
+        analyzed_frames = stats['total_frames'] - stats['skip_frames']
+        if remaining_frames == 0:
+            return self.make_judgment(stats, analyzed_frames, config)
+        
+        conditions = self.chord_conditions(stats, config)
+        possible_frames = analyzed_frames + remaining_frames
+        
+        # 残りが全て和音以外のフレームでも比率が閾値以上 → 和音で確定
+        if analyzed_frames > 0 and any(frames / possible_frames >= threshold for frames, threshold in conditions):
+            return 'chord'
+        
+        # 残りが全て和音のフレームでも比率が閾値未満 → メロディで確定
+        if all((frames + remaining_frames) / possible_frames < threshold for frames, threshold in conditions):
+            return 'melody'
+        
+        return None
+        
+    def merge_stats(self, total, stats):
+        """
+        分割して分析した統計情報を合算する
+        フレーム数は加算し、最大音量は最大値をとる
+        """
+        if total is None:
+            return dict(stats)
+        
+        merged = dict(total)
+        for key, value in stats.items():
+            if key == 'max_volume_db':
+                merged[key] = max(merged[key], value)
+            elif isinstance(value, (int, np.integer)):
+                merged[key] = merged.get(key, 0) + int(value)
+        return self.finalize_stats(merged)
+        
+    def finalize_stats(self, stats):
+        """
+        合算後のフレーム数から比率などの派生値を計算し直す
+        """
+        return stats
         
     def format_stats(self, stats, total_frames):
         """
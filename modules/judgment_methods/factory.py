@@ -1,5 +1,7 @@
 from .two_stage import TwoStageMethod
 from .pitch_distribution import PitchDistributionMethod
+from .pitch_weighted import PitchWeightedMethod
+from ..instance_pool import InstancePool
 
 def create_judgment_method(method_name):
     """
@@ -8,9 +10,19 @@ def create_judgment_method(method_name):
     methods = {
         'two_stage': TwoStageMethod,
         'pitch_distribution': PitchDistributionMethod,
+        'pitch_weighted': PitchWeightedMethod,
     }
     
     if method_name not in methods:
         raise ValueError(f"Unknown judgment method: {method_name}")
         
-    return methods[method_name]() 
\ No newline at end of file
+    return methods[method_name]() 
+
+# 判定方式のプール（プロセス・スレッドごとに構築済みのものを使い回す）
+_judgment_method_pool = InstancePool('judgment_method', create_judgment_method)
+
+def get_judgment_method(method_name):
+    """
+    指定された名前の判定方式の構築済みのインスタンスを返す
+    """
+    return _judgment_method_pool.get((method_name,))
@@ -1,7 +1,9 @@
-from .base import JudgmentMethod
+from .base import JudgmentMethod, FRAME_CHORD, FRAME_MELODY
 import numpy as np
 
 class PitchDistributionMethod(JudgmentMethod):
+    frame_params = ('low_pitch_threshold', 'high_pitch_threshold')
+
     def analyze_frames(self, valid_frames, pitches, config):
         """
         音域分布に基づくフレーム分析
@@ -10,58 +12,43 @@ class PitchDistributionMethod(JudgmentMethod):
         low_threshold = config.get('low_pitch_threshold', 48)   # C3
         high_threshold = config.get('high_pitch_threshold', 72) # C5
         
-        # 分析用カウンター
-        chord_frames = 0
-        melody_frames = 0
-        frame_types = []
+        # 有効フレームのピッチをまとめて取り出す
+        frames = pitches[valid_frames]
+        frame_pitches = frames.notes
+        active = frame_pitches > 0
+        
+        # 音域ごとの音符数をカウント
+        active_notes = frames.active_counts
+        low_notes = (active & (frame_pitches <= low_threshold)).sum(axis=1)
+        mid_notes = (active & (frame_pitches > low_threshold) & (frame_pitches <= high_threshold)).sum(axis=1)
+        high_notes = (active & (frame_pitches > high_threshold)).sum(axis=1)
+        
+        has_low = low_notes > 0
+        has_mid = mid_notes > 0
+        has_high = high_notes > 0
+        
+        # 広い音域の使用判定（2つ以上の音域を使用）
+        used_ranges = has_low.astype(np.int64) + has_mid + has_high
+        is_wide = used_ranges >= 2
         
         # 音域分布の統計
         range_stats = {
-            'low_range_frames': 0,    # 低音域を含むフレーム
-            'mid_range_frames': 0,    # 中音域を含むフレーム
-            'high_range_frames': 0,   # 高音域を含むフレーム
-            'wide_range_frames': 0,   # 広い音域を使用するフレーム
+            'low_range_frames': int(has_low.sum()),    # 低音域を含むフレーム
+            'mid_range_frames': int(has_mid.sum()),    # 中音域を含むフレーム
+            'high_range_frames': int(has_high.sum()),  # 高音域を含むフレーム
+            'wide_range_frames': int(is_wide.sum()),   # 広い音域を使用するフレーム
         }
         
-        for i in valid_frames:
-            frame_pitches = pitches[i]
-            active_pitches = frame_pitches[frame_pitches > 0]
-            
-            if len(active_pitches) > 0:
-                # 音域ごとの音符数をカウント
-                low_notes = sum(1 for p in active_pitches if p <= low_threshold)
-                mid_notes = sum(1 for p in active_pitches if low_threshold < p <= high_threshold)
-                high_notes = sum(1 for p in active_pitches if p > high_threshold)
-                
-                # 音域の使用状況を記録
-                if low_notes > 0:
-                    range_stats['low_range_frames'] += 1
-                if mid_notes > 0:
-                    range_stats['mid_range_frames'] += 1
-                if high_notes > 0:
-                    range_stats['high_range_frames'] += 1
-                
-                # 広い音域の使用判定
-                used_ranges = sum(1 for x in [low_notes, mid_notes, high_notes] if x > 0)
-                if used_ranges >= 2:  # 2つ以上の音域を使用
-                    range_stats['wide_range_frames'] += 1
-                
-                # コード判定の条件
-                is_chord = (
-                    (low_notes > 0 and (mid_notes > 0 or high_notes > 0)) or  # 低音域と他の音域の組み合わせ
-                    (len(active_pitches) >= 3 and mid_notes >= 2) or          # 中音域での和音
-                    used_ranges >= 2                                          # 広い音域の使用
-                )
-                
-                if is_chord:
-                    chord_frames += 1
-                    frame_types.append('chord')
-                else:
-                    melody_frames += 1
-                    frame_types.append('melody')
-            else:
-                melody_frames += 1
-                frame_types.append('melody')
+        # コード判定の条件（音のないフレームは全ての条件が偽になりメロディ扱い）
+        is_chord = (
+            (has_low & (has_mid | has_high)) |           # 低音域と他の音域の組み合わせ
+            ((active_notes >= 3) & (mid_notes >= 2)) |   # 中音域での和音
+            is_wide                                      # 広い音域の使用
+        )
+        
+        chord_frames = int(is_chord.sum())
+        melody_frames = len(valid_frames) - chord_frames
+        frame_types = np.where(is_chord, FRAME_CHORD, FRAME_MELODY).astype(np.int8)
         
         stats = {
             'chord_frames': chord_frames,
@@ -71,25 +58,11 @@ class PitchDistributionMethod(JudgmentMethod):
         
         return frame_types, stats
 
-    def make_judgment(self, stats, analyzed_frames, config):
+    def chord_conditions(self, stats, config):
         """
-        統計情報から最終判定を行う
+        広い音域または低音域を一定以上使用していれば和音
         """
-        if analyzed_frames == 0:
-            return 'melody'
-        
-        # 音域使用率の計算
-        wide_range_ratio = stats['wide_range_frames'] / analyzed_frames
-        low_range_ratio = stats['low_range_frames'] / analyzed_frames
-        
-        # 判定閾値
-        wide_range_threshold = config.get('wide_range_threshold', 0.15)  # 広い音域使用の閾値
-        low_range_threshold = config.get('low_range_threshold', 0.1)    # 低音域使用の閾値
-        
-        # コード判定条件
-        is_chord = (
-            wide_range_ratio >= wide_range_threshold or  # 広い音域を一定以上使用
-            low_range_ratio >= low_range_threshold       # 低音域を一定以上使用
-        )
-        
-        return 'chord' if is_chord else 'melody' 
\ No newline at end of file
+        return [
+            (stats['wide_range_frames'], config.get('wide_range_threshold', 0.15)),  # 広い音域使用の閾値
+            (stats['low_range_frames'], config.get('low_range_threshold', 0.1)),    # 低音域使用の閾値
+        ]
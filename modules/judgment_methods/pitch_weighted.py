@@ -0,0 +1,104 @@
+from .base import JudgmentMethod, FRAME_CHORD, FRAME_MELODY
+import numpy as np
+
+# 重みのテーブルを作るMIDIノート番号の範囲
+MIDI_NOTES = 128
+
+def weight_table(pitch_weight):
+    """
+    MIDIノート番号ごとの重みのテーブルを作成
+    - base_noteより低い音は1音階ごとにlow_rateずつ重みを増やす（low_weightで頭打ち）
+    - base_noteより高い音は1音階ごとにhigh_rateずつ重みを減らす（high_weightで下げ止まり）
+    """
+    base_note = pitch_weight.get('base_note', 60)
+    low_weight = pitch_weight.get('low_weight', 1.5)
+    high_weight = pitch_weight.get('high_weight', 1.0)
+    low_rate = pitch_weight.get('low_rate', 0.02)
+    high_rate = pitch_weight.get('high_rate', 0.02)
+
+    notes = np.arange(MIDI_NOTES, dtype=np.float64)
+    low = 1.0 + low_rate * (base_note - notes)
+    high = 1.0 - high_rate * (notes - base_note)
+    low = np.minimum(low, low_weight) if low_weight >= 1.0 else np.maximum(low, low_weight)
+    high = np.maximum(high, high_weight) if high_weight <= 1.0 else np.minimum(high, high_weight)
+    return np.where(notes < base_note, low, high).astype(np.float32)
+
+class PitchWeightedMethod(JudgmentMethod):
+    frame_params = ('pitch_weight', 'weighted_pitch_threshold', 'low_note_threshold')
+
+    def __init__(self):
+        # 重み付けの設定ごとのテーブル
+        self._tables = {}
+
+    def _weight_table(self, config):
+        pitch_weight = config.get('pitch_weight', None) or {}
+        key = tuple(sorted(pitch_weight.items()))
+        if key not in self._tables:
+            self._tables[key] = weight_table(pitch_weight)
+        return self._tables[key]
+
+    def analyze_frames(self, valid_frames, pitches, config):
+        """
+        音階で重み付けした同時発音数による分析
+        低い音ほど重みが大きく、低音を含む少ない音数でも和音と判定しやすくする
+        """
+        weighted_pitch_threshold = config.get('weighted_pitch_threshold', 2.0)
+        low_note_threshold = config.get('low_note_threshold', 48)  # C3以下を低音とみなす
+        table = self._weight_table(config)
+        
+        # 有効フレームのピッチ（MIDIノート番号）をまとめて取り出す
+        frame_notes = pitches[valid_frames].notes
+        active = frame_notes > 0
+        
+        # テーブルを引いて重みを求め、フレームごとに合計する
+        note_index = np.clip(np.rint(frame_notes), 0, MIDI_NOTES - 1).astype(np.intp)
+        weights = np.where(active, table[note_index], 0.0)
+        weighted_pitches = weights.sum(axis=1)
+        
+        is_chord = weighted_pitches >= weighted_pitch_threshold
+        has_low_note = (active & (frame_notes <= low_note_threshold)).any(axis=1)
+        
+        chord_frames = int(is_chord.sum())
+        melody_frames = len(valid_frames) - chord_frames
+        low_chord_frames = int((is_chord & has_low_note).sum())
+        frame_types = np.where(is_chord, FRAME_CHORD, FRAME_MELODY).astype(np.int8)
+        
+        stats = self.finalize_stats({
+            'chord_frames': chord_frames,
+            'melody_frames': melody_frames,
+            'low_chord_frames': low_chord_frames,
+        })
+        
+        return frame_types, stats
+
+    def finalize_stats(self, stats):
+        """
+        合算後のフレーム数から比率を計算し直す
+        """
+        analyzed_frames = stats['chord_frames'] + stats['melody_frames']
+        return {
+            **stats,
+            'low_chord_ratio': stats['low_chord_frames'] / analyzed_frames if analyzed_frames > 0 else 0,
+            'weighted_chord_ratio': stats['chord_frames'] / analyzed_frames if analyzed_frames > 0 else 0
+        }
+
+    def chord_conditions(self, stats, config):
+        """
+        重み付けで和音となったフレームの比率、またはそのうち低音を含むフレームの比率が閾値以上なら和音
+        """
+        return [
+            (stats['low_chord_frames'], config.get('low_chord_ratio_threshold', 0.1)),  # 低音和音
+            (stats['chord_frames'], config.get('chord_ratio_threshold', 0.2)),          # 重み付きの和音
+        ]
+
+    def format_stats(self, stats, total_frames):
+        # 基本的な統計情報を取得
+        base_stats = super().format_stats(stats, total_frames)
+        
+        # 音階重み付け方式固有の統計情報を追加
+        additional_stats = [
+            f"Low Chord Ratio: {stats['low_chord_ratio']*100:.1f}%",
+            f"Weighted Chord Ratio: {stats['weighted_chord_ratio']*100:.1f}%"
+        ]
+        
+        return base_stats + "\n" + "\n".join(additional_stats)
@@ -1,6 +1,9 @@
-from .base import JudgmentMethod
+from .base import JudgmentMethod, FRAME_CHORD, FRAME_MELODY
+import numpy as np
 
 class TwoStageMethod(JudgmentMethod):
+    frame_params = ('simultaneous_pitch_threshold', 'low_note_threshold')
+
     def analyze_frames(self, valid_frames, pitches, config):
         """
         二段階判定方式による分析
@@ -9,29 +12,18 @@ class TwoStageMethod(JudgmentMethod):
         simultaneous_pitch_threshold = config.get('simultaneous_pitch_threshold', 2)
         low_note_threshold = config.get('low_note_threshold', 48)  # C3以下を低音とみなす
         
-        # カウンター初期化
-        chord_frames = 0
-        melody_frames = 0
-        low_chord_frames = 0
+        # 有効フレームのピッチをまとめて取り出す
+        frames = pitches[valid_frames]
+        
+        # 通常の和音判定
+        is_chord = frames.active_counts >= simultaneous_pitch_threshold
+        # 低音を含む和音かチェック（最低音が閾値以下）
+        has_low_note = (frames.active_counts > 0) & (frames.min_notes <= low_note_threshold)
         
-        # フレーム分析
-        frame_types = []
-        for i in valid_frames:
-            frame_pitches = pitches[i]
-            active_pitches = frame_pitches[frame_pitches > 0]
-            
-            if len(active_pitches) >= simultaneous_pitch_threshold:
-                # 通常の和音判定
-                chord_frames += 1
-                frame_types.append('chord')
-                
-                # 低音を含む和音かチェック
-                has_low_note = any(pitch <= low_note_threshold for pitch in active_pitches)
-                if has_low_note:
-                    low_chord_frames += 1
-            else:
-                melody_frames += 1
-                frame_types.append('melody')
+        chord_frames = int(is_chord.sum())
+        melody_frames = len(valid_frames) - chord_frames
+        low_chord_frames = int((is_chord & has_low_note).sum())
+        frame_types = np.where(is_chord, FRAME_CHORD, FRAME_MELODY).astype(np.int8)
         
         # 統計情報に必要な比率を追加
         stats = {
@@ -44,25 +36,25 @@ class TwoStageMethod(JudgmentMethod):
         
         return frame_types, stats
 
-    def make_judgment(self, stats, analyzed_frames, config):
+    def finalize_stats(self, stats):
         """
-        統計情報から最終判定を行う
+        合算後のフレーム数から比率を計算し直す
         """
-        if analyzed_frames == 0:
-            return 'melody'
-            
-        low_chord_ratio = stats['low_chord_frames'] / analyzed_frames
-        normal_chord_ratio = stats['chord_frames'] / analyzed_frames
-        
-        # 判定閾値
-        low_chord_ratio_threshold = config.get('low_chord_ratio_threshold', 0.1)
-        chord_ratio_threshold = config.get('chord_ratio_threshold', 0.2)
-        
-        # 低音和音の比率が一定以上、または通常の和音比率が閾値以上
-        is_chord = (low_chord_ratio >= low_chord_ratio_threshold) or \
-                   (normal_chord_ratio >= chord_ratio_threshold)
-                   
-        return 'chord' if is_chord else 'melody' 
+        analyzed_frames = stats['chord_frames'] + stats['melody_frames']
+        return {
+            **stats,
+            'low_chord_ratio': stats['low_chord_frames'] / analyzed_frames if analyzed_frames > 0 else 0,
+            'normal_chord_ratio': stats['chord_frames'] / analyzed_frames if analyzed_frames > 0 else 0
+        }
+
+    def chord_conditions(self, stats, config):
+        """
+        低音和音の比率が一定以上、または通常の和音比率が閾値以上なら和音
+        """
+        return [
+            (stats['low_chord_frames'], config.get('low_chord_ratio_threshold', 0.1)),  # 低音和音
+            (stats['chord_frames'], config.get('chord_ratio_threshold', 0.2)),          # 通常の和音
+        ]
 
     def format_stats(self, stats, total_frames):
         # 基本的な統計情報を取得
@@ -0,0 +1,172 @@
+# modules/manifest.py
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+from .file_finder import list_directory
+
+# 判定の処理を変更した場合はこの値を上げる（記録済みの判定結果は使われなくなる）
+ANALYSIS_VERSION = 2
+
+# 判定結果に影響しない設定（設定のハッシュ値から除外する）
+OPERATIONAL_KEYS = (
+    'logging_level',
+    'file_timeout_sec',
+    'feature_cache_enabled',
+    'feature_cache_dir',
+    'feature_cache_max_mb',
+    'feature_cache_rebuild',
+    'stage_log_path',
+    'profile_dir',
+    'profile_top_n',
+    'manifest_enabled',
+    'manifest_path',
+    'manifest_skip_unchanged_dirs',
+    'discovery_threads',
+    'rename_journal_path',
+    'result_export_path',
+    'result_export_frames',
+    'result_export_row_group',
+    'pipeline_enabled',
+    'pipeline_queue_depth',
+    'pipeline_read_threads',
+    'pipeline_decode_threads',
+    'pipeline_decode_depth',
+    'pipeline_prefetch_max_mb',
+    'shard_dir',
+    'shard_lease_timeout_sec',
+    'service_workers',
+    'service_host',
+    'service_port',
+    'service_socket',
+    'service_max_requests',
+    'service_max_files_per_request',
+)
+
+def open_manifest(config):
+    """
+    設定に従ってマニフェストを開く
+    マニフェストが無効な場合はNoneを返す
+    """
+    if not config.get('manifest_enabled', True):
+        return None
+    return Manifest(
+        config.get('manifest_path', '.analysis_manifest.sqlite'),
+        config_hash(config),
+        config.get('manifest_skip_unchanged_dirs', False),
+    )
+
+def config_hash(config):
+    """
+    判定結果に影響する設定のハッシュ値
+    """
+    relevant = {key: value for key, value in config.items() if key not in OPERATIONAL_KEYS}
+    relevant['analysis_version'] = ANALYSIS_VERSION
+    encoded = json.dumps(relevant, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha1(encoded).hexdigest()
+
+class Manifest:
+    """
+    ファイルごとの判定結果を記録し、再実行時に変更のないファイルを省略するための記録
+    - files: パス・サイズ・mtime・設定のハッシュ値・判定結果・統計情報・出力
+    - dirs: ディレクトリのmtimeと、その時点の対象ファイル名・サブディレクトリ名
+    """
+    def __init__(self, path, config_hash, skip_unchanged_dirs=False):
+        self.config_hash = config_hash
+        self.skip_unchanged_dirs = skip_unchanged_dirs
+        # ディレクトリの一覧は探索スレッドから呼ばれるため、接続の利用はロックで直列化する
+        self.lock = threading.Lock()
+        self.trusted_files = set()  # 一覧を省略したディレクトリ内のファイルパス
+        self.db = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS files ('
+            'path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, config_hash TEXT, '
+            'verdict TEXT, stats TEXT, output TEXT, updated_at REAL)'
+        )
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS dirs ('
+            'path TEXT PRIMARY KEY, mtime_ns INTEGER, files TEXT, subdirs TEXT)'
+        )
+        self.db.commit()
+
+    def list_directory(self, path):
+        """
+        file_finder.list_directoryと同じ形式で1ディレクトリ分の一覧を返し、記録する
+        skip_unchanged_dirsの場合、mtimeが前回と同じディレクトリは一覧を取得せず記録済みの内容を使う
+        （ディレクトリのmtimeはファイル内容の変更では変わらないため、上書きされたファイルは検出できない）
+        """
+        abs_path = os.path.abspath(path)
+        mtime_ns = os.stat(abs_path).st_mtime_ns
+
+        if self.skip_unchanged_dirs:
+            with self.lock:
+                row = self.db.execute(
+                    'SELECT mtime_ns, files, subdirs FROM dirs WHERE path = ?', (abs_path,)
+                ).fetchone()
+                if row is not None and row[0] == mtime_ns:
+                    file_names = json.loads(row[1])
+                    self.trusted_files.update(os.path.join(abs_path, name) for name in file_names)
+                    return file_names, json.loads(row[2])
+
+        file_names, subdir_names = list_directory(path)
+        with self.lock:
+            # 記録は次のrecord()かclose()でコミットされる
+            self.db.execute(
+                'INSERT OR REPLACE INTO dirs VALUES (?, ?, ?, ?)',
+                (abs_path, mtime_ns, json.dumps(file_names), json.dumps(subdir_names))
+            )
+        return file_names, subdir_names
+
+    def lookup(self, file_path):
+        """
+        変更がなく、同じ設定で判定済みのファイルの記録を取得
+        一覧を省略したディレクトリ内のファイルはstatを省略して記録済みの値を信用する
+        Returns:
+            dict: {'verdict', 'stats', 'output'} または None
+        """
+        path = os.path.abspath(file_path)
+        with self.lock:
+            row = self.db.execute(
+                'SELECT size, mtime_ns, config_hash, verdict, stats, output FROM files WHERE path = ?', (path,)
+            ).fetchone()
+            trust_stat = path in self.trusted_files
+        if row is None or row[2] != self.config_hash:
+            return None
+
+        if not trust_stat:
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                return None
+            if (st.st_size, st.st_mtime_ns) != (row[0], row[1]):
+                return None
+
+        return {'verdict': row[3], 'stats': json.loads(row[4]), 'output': row[5]}
+
+    def record(self, file_path, verdict, stats, output):
+        """
+        判定結果を記録する
+        """
+        path = os.path.abspath(file_path)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return
+        with self.lock:
+            self.db.execute(
+                'INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (
+                    path, st.st_size, st.st_mtime_ns, self.config_hash, verdict,
+                    json.dumps(stats, default=float), output, time.time(),
+                )
+            )
+            self.db.commit()
+
+    def close(self):
+        with self.lock:
+            self.db.commit()
+            self.db.close()
@@ -0,0 +1,106 @@
+# modules/memory_budget.py
+
+import soundfile as sf
+
+# 全体を読み込んで解析するときの、解析レートの1サンプルあたりのメモリ（バイト）
+# float32の信号・Essentiaの内部コピー・多ピッチ推定の中間データの合計（44.1kHzの実測値に余裕を持たせた値）
+BYTES_PER_SAMPLE = 16
+# 解析ライブラリを読み込んだプロセス1つあたりのメモリ（MB、実測値）
+PROCESS_BASE_MB = 160
+# 予算に合わせて短くする場合のストリーミング解析のウィンドウの下限（秒）
+MIN_WINDOW_SEC = 5
+
+_MB = 1024 * 1024
+
+def estimate_file_bytes(file_path, config):
+    """
+    ファイル全体を読み込んで解析したときのピークメモリの見積もり（バイト）
+    - 解析レートの信号とその解析に必要なメモリ
+    - 複数チャンネルのファイルはチャンネル数分の読み込みバッファ、リサンプルする場合は元の信号の分を加える
+    """
+    info = sf.info(file_path)
+    sr = config.get('sample_rate', None) or info.samplerate
+    samples = info.frames * sr / info.samplerate
+    estimate = samples * BYTES_PER_SAMPLE
+    if info.channels > 1:
+        estimate += info.frames * info.channels * 4
+    if sr != info.samplerate:
+        estimate += info.frames * 4
+    return int(estimate)
+
+def exceeds_file_budget(file_path, config):
+    """
+    1ファイルのメモリ予算（file_memory_budget_mb）を超えるファイルかどうか（予算がなければFalse）
+    soundfileで読めない形式はストリーミング解析できないためFalse（全体の読み込みでlibrosa.loadに任せる）
+    """
+    budget_mb = config.get('file_memory_budget_mb', None)
+    if not budget_mb:
+        return False
+    try:
+        return estimate_file_bytes(file_path, config) > budget_mb * _MB
+    except RuntimeError:
+        return False
+
+def budget_window_sec(window_sec, config):
+    """
+    ストリーミング解析のウィンドウの長さをメモリ予算に収まるように短くする（下限はMIN_WINDOW_SEC）
+    """
+    budget_mb = config.get('file_memory_budget_mb', None)
+    if not budget_mb:
+        return window_sec
+    sr = config.get('sample_rate') or 44100
+    # 前後のオーバーラップの分も同時に保持する
+    fit_sec = budget_mb * _MB / (BYTES_PER_SAMPLE * sr) - 2 * config.get('stream_overlap_sec', 1)
+    return max(MIN_WINDOW_SEC, min(window_sec, fit_sec))
+
+def _in_flight_files(config):
+    """
+    1プロセスで同時に保持するファイル数（パイプラインではデコード済みで解析待ち・解析中・先読みの分）
+    """
+    if not config.get('pipeline_enabled', True):
+        return 1
+    return config.get('pipeline_decode_depth', 2) + 2
+
+def planned_memory_mb(config, workers, file_budget_mb):
+    """
+    ワーカー数と1ファイルの予算から見積もった全体のメモリ（MB）
+    """
+    if workers > 1:
+        return PROCESS_BASE_MB + workers * (PROCESS_BASE_MB + file_budget_mb)
+    return PROCESS_BASE_MB + _in_flight_files(config) * file_budget_mb
+
+def plan_memory(config, workers):
+    """
+    メモリの上限（max_memory_mb）からワーカー数と1ファイルのメモリ予算を決める
+    - 並列処理: 親プロセスとワーカーごとのプロセスの分を除いた残りをワーカーで分ける
+      （1ファイルにmin_file_memory_mbも割り当てられない場合はワーカー数を減らす）
+    - 1プロセス: パイプラインで同時に保持する信号（デコード済みで解析待ち・解析中）と先読みの分で分ける
+      （1ファイルにmin_file_memory_mbも割り当てられない場合はデコード済みで待つファイル数を減らし、
+      それでも足りなければパイプラインを無効にする）
+    予算を超えるファイルはストリーミング解析し、ウィンドウの長さも予算に合わせる
+    min_file_memory_mbを下回る予算にはしないため、上限が小さすぎる場合は見積もりが上限を超える（planned_memory_mbで確認する）
+    Returns:
+        tuple: (ワーカー数, 1ファイルのメモリ予算（MB）, 変更する設定のdict) 上限がなければ予算はNone
+    """
+    max_memory_mb = config.get('max_memory_mb', None)
+    if not max_memory_mb:
+        return workers, None, {}
+    min_file_mb = config.get('min_file_memory_mb', 64)
+
+    available_mb = max_memory_mb - PROCESS_BASE_MB
+    if workers > 1:
+        workers = max(1, min(workers, int(available_mb // (PROCESS_BASE_MB + min_file_mb))))
+    if workers > 1:
+        return workers, int((available_mb - workers * PROCESS_BASE_MB) / workers), {}
+
+    overrides = {}
+    if config.get('pipeline_enabled', True):
+        decode_depth = config.get('pipeline_decode_depth', 2)
+        while decode_depth > 1 and available_mb / (decode_depth + 2) < min_file_mb:
+            decode_depth -= 1
+        if available_mb / (decode_depth + 2) < min_file_mb:
+            overrides['pipeline_enabled'] = False
+        elif decode_depth != config.get('pipeline_decode_depth', 2):
+            overrides['pipeline_decode_depth'] = decode_depth
+    file_budget_mb = available_mb / _in_flight_files({**config, **overrides})
+    return workers, max(min_file_mb, int(file_budget_mb)), overrides
@@ -0,0 +1,212 @@
+# modules/pipeline.py
+
+import time
+import threading
+import collections
+import concurrent.futures
+
+import numpy as np
+
+from .analysis import read_source, prepare_file
+from .batch_runner import process_file, _error_result
+from .feature_cache import open_feature_cache
+from .profiler import FileProfile, merge_records
+
+# ファイルの状態（段階）
+READING = 'reading'    # 読み込み中
+READ = 'read'          # 読み込み済みでデコードの空きを待っている
+DECODING = 'decoding'  # デコード中（キャッシュの読み込みを含む）
+READY = 'ready'        # 解析待ち
+DONE = 'done'          # 結果が決まっている（マニフェストの結果・エラー）
+
+STATES = (READING, READ, DECODING, READY)
+
+class PipelineMetrics:
+    """
+    解析を始めるたびに段階ごとのファイル数（キューの占有数）を記録する
+    - 解析待ち（ready）が常に多い → 解析がボトルネック
+    - 読み込み中・デコード中が多く解析待ちが0 → 前段がボトルネック（解析が待たされた時間も記録する）
+    """
+    def __init__(self):
+        self.samples = {state: [] for state in STATES}
+        self.analysis_wait_sec = 0.0
+        self.files = 0
+
+    def sample(self, entries):
+        counts = collections.Counter(entry.state for entry in entries)
+        for state in STATES:
+            self.samples[state].append(counts[state])
+
+    def summary_lines(self):
+        if not self.files:
+            return []
+        lines = [f"Pipeline queue occupancy ({self.files} files):"]
+        for state in STATES:
+            values = np.asarray(self.samples[state] or [0])
+            lines.append(f"- {state:<9} mean {values.mean():5.2f} max {values.max():3d}")
+        lines.append(f"Analysis waited for upstream stages: {self.analysis_wait_sec:.2f}s")
+        return lines
+
+class _Entry:
+    __slots__ = ('file_path', 'state', 'source', 'prepared', 'record', 'result', 'ready')
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.state = READING
+        self.source = None
+        self.prepared = None
+        self.record = None
+        self.result = None
+        self.ready = threading.Event()
+
+class _Pipeline:
+    """
+    読み込み（read_threads）→ デコード（decode_threads）の前段をスレッドで先行させる
+    - 先行するファイル数はqueue_depth、デコード済み・デコード中のファイル数はdecode_depthで制限する
+    """
+    def __init__(self, config):
+        self.config = config
+        self.read_pool = concurrent.futures.ThreadPoolExecutor(
+            max(1, config.get('pipeline_read_threads', 2)), thread_name_prefix='pipeline-read'
+        )
+        self.decode_pool = concurrent.futures.ThreadPoolExecutor(
+            max(1, config.get('pipeline_decode_threads', 1)), thread_name_prefix='pipeline-decode'
+        )
+        self.decode_depth = max(1, config.get('pipeline_decode_depth', 2))
+        self.prefetch_max_bytes = config.get('pipeline_prefetch_max_mb', 256) * 1024 * 1024
+        self.lock = threading.Lock()
+        # 読み込みを始めた順のファイル（デコードは必ずこの順で始め、後のファイルが先に
+        # デコードの枠を埋めて解析中のファイルのデコードが始められなくなるのを防ぐ）
+        self.pending = collections.deque()
+        self.decoded = 0  # デコード中・解析待ちのファイル数
+        # 特徴量キャッシュ（SQLiteの接続はスレッドごとに開く）
+        self.local = threading.local()
+
+    def submit(self, entry):
+        with self.lock:
+            self.pending.append(entry)
+        self.read_pool.submit(self._read, entry)
+
+    def consumed(self):
+        """
+        解析を始めたファイルの分だけデコードの空きを増やす
+        """
+        with self.lock:
+            self.decoded -= 1
+        self._schedule_decodes()
+
+    def _cache(self):
+        if not hasattr(self.local, 'cache'):
+            self.local.cache = open_feature_cache(self.config)
+        return self.local.cache
+
+    def _read(self, entry):
+        try:
+            profile = FileProfile(entry.file_path, track_rss=False)
+            with profile:
+                entry.source = read_source(entry.file_path, self.prefetch_max_bytes)
+            entry.record = profile.record
+        except Exception as e:
+            self._fail(entry, e)
+        else:
+            with self.lock:
+                entry.state = READ
+        self._schedule_decodes()
+
+    def _schedule_decodes(self):
+        with self.lock:
+            while self.pending and self.decoded < self.decode_depth:
+                entry = self.pending[0]
+                if entry.state == DONE:
+                    self.pending.popleft()
+                    continue
+                if entry.state != READ:
+                    break
+                self.pending.popleft()
+                entry.state = DECODING
+                self.decoded += 1
+                self.decode_pool.submit(self._decode, entry)
+
+    def _decode(self, entry):
+        try:
+            profile = FileProfile(entry.file_path, track_rss=False)
+            with profile:
+                prepared = prepare_file(entry.file_path, self.config, self._cache(), entry.source)
+        except Exception as e:
+            with self.lock:
+                self.decoded -= 1
+            self._fail(entry, e)
+            self._schedule_decodes()
+            return
+        merge_records(profile.record, entry.record)
+        entry.record = profile.record
+        entry.prepared = prepared
+        entry.source = None
+        entry.state = READY
+        entry.ready.set()
+
+    def _fail(self, entry, error):
+        entry.result = _error_result(entry.file_path, str(error))
+        with self.lock:
+            entry.state = DONE
+        entry.ready.set()
+
+    def close(self):
+        self.read_pool.shutdown(wait=True, cancel_futures=True)
+        self.decode_pool.shutdown(wait=True, cancel_futures=True)
+
+def iter_pipelined_results(file_paths, config, lookup=None, metrics=None):
+    """
+    読み込み・デコードをスレッドで先行させ、解析（多ピッチ推定・判定）と並行させる
+    結果は入力順に返す（lookupが結果を返したファイルは処理せずその結果を返す）
+    - EssentiaとNumPyは重い処理の間GILを解放するため、スレッドでも重ねて実行できる
+    - 早期打ち切り・ストリーミング解析のファイルは、デコードをウィンドウ単位で解析と交互に行うため、
+      前段では読み込みだけを先行させる
+    """
+    if metrics is None:
+        metrics = PipelineMetrics()
+    queue_depth = max(1, config.get('pipeline_queue_depth', 4))
+    cache = open_feature_cache(config)
+    pipeline = _Pipeline(config)
+
+    file_paths = iter(file_paths)
+    queued = collections.deque()
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and len(queued) < queue_depth + 1:
+                file_path = next(file_paths, None)
+                if file_path is None:
+                    exhausted = True
+                    break
+                entry = _Entry(file_path)
+                result = lookup(file_path) if lookup is not None else None
+                if result is not None:
+                    entry.result = result
+                    entry.state = DONE
+                    entry.ready.set()
+                else:
+                    pipeline.submit(entry)
+                queued.append(entry)
+
+            if not queued:
+                break
+
+            entry = queued.popleft()
+            if entry.result is None:
+                metrics.sample(queued)
+                metrics.files += 1
+                started = time.perf_counter()
+                entry.ready.wait()
+                metrics.analysis_wait_sec += time.perf_counter() - started
+
+            if entry.result is not None:
+                result = entry.result
+            else:
+                prepared, record = entry.prepared, entry.record
+                entry.prepared = entry.record = None
+                pipeline.consumed()
+                result = process_file(entry.file_path, config, cache, prepared, record)
+            yield result
+    finally:
+        pipeline.close()
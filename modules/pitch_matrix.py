@@ -0,0 +1,100 @@
+# modules/pitch_matrix.py
+
+import numpy as np
+
+def pack_pitches(pitches):
+    """
+    フレームごとに長さの異なるピッチ配列を、値の連結配列とオフセット配列に変換
+    """
+    lengths = np.fromiter((len(p) for p in pitches), dtype=np.int64, count=len(pitches))
+    offsets = np.zeros(len(pitches) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    if offsets[-1] > 0:
+        values = np.concatenate([np.asarray(p, dtype=np.float32) for p in pitches])
+    else:
+        values = np.zeros(0, dtype=np.float32)
+    return values, offsets
+
+def matrix_from_packed(values, offsets):
+    """
+    連結配列とオフセット配列を (フレーム数, 最大同時発音数) のfloat32配列に詰め直す
+    音のない位置は0で埋める
+    """
+    lengths = np.diff(offsets)
+    width = int(lengths.max()) if len(lengths) > 0 else 0
+
+    matrix = np.zeros((len(lengths), width), dtype=np.float32)
+    matrix[np.arange(width) < lengths[:, None]] = values
+    return matrix
+
+def hz_to_midi(values):
+    """
+    Hzの値をMIDIノート番号に変換する
+    """
+    return (69.0 + 12.0 * np.log2(np.asarray(values, dtype=np.float64) / 440.0)).astype(np.float32)
+
+class PitchFrames:
+    """
+    1ファイル分のフレームごとのピッチ（MultiPitchMelodiaの出力から1度だけ作成し、全ての判定方式で共有する）
+    - notes: (フレーム数, 最大同時発音数) のfloat32配列（MIDIノート番号、音は左詰めで音のない位置は0）
+    - active_counts: フレームごとの検出ピッチ数（int16）
+    - min_notes / max_notes: フレームごとの最低音・最高音（float32、音のないフレームは0）
+    スライス・インデックス配列でフレームを選ぶと、同じ形式のPitchFramesを返す
+    """
+    __slots__ = ('notes', 'active_counts', 'min_notes', 'max_notes')
+
+    def __init__(self, notes, active_counts, min_notes, max_notes):
+        self.notes = notes
+        self.active_counts = active_counts
+        self.min_notes = min_notes
+        self.max_notes = max_notes
+
+    @classmethod
+    def from_packed_notes(cls, values, offsets):
+        """
+        MIDIノート番号の連結配列とオフセット配列から作成
+        """
+        notes = matrix_from_packed(values, offsets)
+        active_counts = np.diff(offsets).astype(np.int16)
+        if notes.shape[1] > 0:
+            min_notes = np.where(active_counts > 0, notes.min(axis=1, where=notes > 0, initial=np.inf), 0)
+            max_notes = notes.max(axis=1)
+        else:
+            min_notes = np.zeros(len(notes))
+            max_notes = np.zeros(len(notes))
+        return cls(notes, active_counts, min_notes.astype(np.float32), max_notes.astype(np.float32))
+
+    @classmethod
+    def from_hz(cls, pitches):
+        """
+        MultiPitchMelodiaの出力（フレームごとのHzの配列）から作成する
+        0以下の値（音なし）は除き、Hz→MIDIの変換は全ての値に対して1度だけ行う
+        """
+        if isinstance(pitches, PitchFrames):
+            return pitches
+        values, offsets = pack_pitches(pitches)
+        active = values > 0
+        if not active.all():
+            # 音のない値を除き、残った値の数でオフセットを詰め直す
+            kept = np.zeros(len(values) + 1, dtype=np.int64)
+            np.cumsum(active, out=kept[1:])
+            offsets = kept[offsets]
+            values = values[active]
+        return cls.from_packed_notes(hz_to_midi(values), offsets)
+
+    def pack(self):
+        """
+        音のある値の連結配列とオフセット配列（保存用）
+        """
+        offsets = np.zeros(len(self.active_counts) + 1, dtype=np.int64)
+        np.cumsum(self.active_counts, out=offsets[1:])
+        values = self.notes[np.arange(self.notes.shape[1]) < self.active_counts[:, None]]
+        return values, offsets
+
+    def __len__(self):
+        return len(self.active_counts)
+
+    def __getitem__(self, index):
+        return PitchFrames(
+            self.notes[index], self.active_counts[index], self.min_notes[index], self.max_notes[index]
+        )
@@ -0,0 +1,243 @@
+# modules/profiler.py
+
+import os
+import io
+import json
+import time
+import heapq
+import marshal
+import pstats
+import cProfile
+import resource
+import contextlib
+import contextvars
+
+import numpy as np
+
+# 処理中のファイルの計測結果（スレッドごとに独立）
+_current_profile = contextvars.ContextVar('current_profile', default=None)
+
+# 集計で表示するパーセンタイル
+PERCENTILES = (50, 90, 99)
+
+def _reset_peak_rss():
+    """
+    プロセスのピークRSSをリセットする（Linuxのみ、失敗しても無視する）
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+def _peak_rss_mb():
+    """
+    プロセスのピークRSS（MB）
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # Linux以外ではプロセス開始からのピーク値になる
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+@contextlib.contextmanager
+def record_stage(record, name):
+    """
+    処理段階の経過時間とCPU時間を計測結果に加算する
+    CPU時間は計測したスレッドの値（パイプラインで並行して動く他のスレッドの分を含めない）
+    """
+    wall_started = time.perf_counter()
+    cpu_started = time.thread_time()
+    try:
+        yield
+    finally:
+        stage_record = record['stages'].setdefault(name, {'wall_sec': 0.0, 'cpu_sec': 0.0})
+        stage_record['wall_sec'] += time.perf_counter() - wall_started
+        stage_record['cpu_sec'] += time.thread_time() - cpu_started
+
+@contextlib.contextmanager
+def stage(name):
+    """
+    処理中のファイルの計測結果に処理段階の時間を記録する（計測していなければ何もしない）
+    """
+    profile = _current_profile.get()
+    if profile is None:
+        yield
+        return
+    with record_stage(profile.record, name):
+        yield
+
+def set_audio_duration(seconds):
+    """
+    処理中のファイルの音声の長さ（秒）を記録する
+    """
+    profile = _current_profile.get()
+    if profile is not None:
+        profile.record['audio_sec'] = seconds
+
+class FileProfile:
+    """
+    1ファイル分の処理段階ごとの計測
+    with FileProfile(path) as profile: の中で stage() を使うと profile.record に記録される
+    """
+    def __init__(self, file_path, use_cprofile=False, track_rss=True):
+        self.record = {
+            'file_path': file_path,
+            'audio_sec': 0.0,
+            'wall_sec': 0.0,
+            'cpu_sec': 0.0,
+            'peak_rss_mb': 0.0,
+            'audio_sec_per_sec': 0.0,
+            'stages': {},
+        }
+        self.profiler = cProfile.Profile() if use_cprofile else None
+        self.pstats_data = None
+        # パイプラインの前段のスレッドではピークRSSをリセットしない（解析中のファイルの計測を乱さない）
+        self.track_rss = track_rss
+
+    def __enter__(self):
+        if self.track_rss:
+            _reset_peak_rss()
+        self._token = _current_profile.set(self)
+        self._wall_started = time.perf_counter()
+        self._cpu_started = time.thread_time()
+        if self.profiler is not None:
+            try:
+                self.profiler.enable()
+            except ValueError:
+                # 他のプロファイラが動作中の場合は取得しない
+                self.profiler = None
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.profiler is not None:
+            self.profiler.disable()
+            self.profiler.create_stats()
+            self.pstats_data = marshal.dumps(self.profiler.stats)
+
+        record = self.record
+        record['wall_sec'] = time.perf_counter() - self._wall_started
+        record['cpu_sec'] = time.thread_time() - self._cpu_started
+        if self.track_rss:
+            record['peak_rss_mb'] = _peak_rss_mb()
+        if record['wall_sec'] > 0:
+            record['audio_sec_per_sec'] = record['audio_sec'] / record['wall_sec']
+        _current_profile.reset(self._token)
+        return False
+
+def merge_records(record, other):
+    """
+    別のスレッドで計測した前段の計測結果（処理段階・経過時間・CPU時間）を合算する
+    （CPU時間はスレッドごとの値のため、合算したものがこのファイルの処理に使ったCPU時間になる）
+    """
+    for name, value in other['stages'].items():
+        stage_record = record['stages'].setdefault(name, {'wall_sec': 0.0, 'cpu_sec': 0.0})
+        stage_record['wall_sec'] += value['wall_sec']
+        stage_record['cpu_sec'] += value['cpu_sec']
+    record['wall_sec'] += other['wall_sec']
+    record['cpu_sec'] += other['cpu_sec']
+    if not record['audio_sec']:
+        record['audio_sec'] = other['audio_sec']
+    if record['wall_sec'] > 0:
+        record['audio_sec_per_sec'] = record['audio_sec'] / record['wall_sec']
+
+class ProfileReport:
+    """
+    バッチ全体の計測結果の出力と集計
+    - ファイルごとの計測結果をJSON Lines形式で書き出す
+    - profile_top_nを指定すると、処理時間の長いN件のcProfile結果を保存する
+    """
+    def __init__(self, log_path=None, profile_top_n=0, profile_dir='profiles'):
+        self.log_file = open(log_path, 'w') if log_path else None
+        self.profile_top_n = profile_top_n
+        self.profile_dir = profile_dir
+        self.records = []
+        self._slowest = []  # (wall_sec, 連番, file_path, pstats_data) の最小ヒープ
+
+    def add(self, record, pstats_data=None):
+        # 集計に必要な値だけを保持する
+        self.records.append({
+            'wall_sec': record['wall_sec'],
+            'audio_sec': record['audio_sec'],
+            'peak_rss_mb': record['peak_rss_mb'],
+            'stages': {name: value['wall_sec'] for name, value in record['stages'].items()},
+        })
+        if self.log_file is not None:
+            self.log_file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self.log_file.flush()
+
+        if pstats_data is not None and self.profile_top_n > 0:
+            entry = (record['wall_sec'], len(self.records), record['file_path'], pstats_data)
+            if len(self._slowest) < self.profile_top_n:
+                heapq.heappush(self._slowest, entry)
+            elif entry[0] > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, entry)
+
+    def _dump_slowest(self):
+        """
+        処理時間の長いファイルのcProfile結果を .pstats と上位関数のテキストで保存する
+        """
+        os.makedirs(self.profile_dir, exist_ok=True)
+        ranked = sorted(self._slowest, reverse=True)
+        for rank, (wall_sec, _, file_path, pstats_data) in enumerate(ranked, 1):
+            base_name = f"{rank:03d}_{os.path.splitext(os.path.basename(file_path))[0]}"
+            pstats_path = os.path.join(self.profile_dir, base_name + '.pstats')
+            with open(pstats_path, 'wb') as f:
+                f.write(pstats_data)
+
+            text = io.StringIO()
+            text.write(f"{file_path} ({wall_sec:.3f}s)\n")
+            pstats.Stats(pstats_path, stream=text).sort_stats('cumulative').print_stats(30)
+            with open(os.path.join(self.profile_dir, base_name + '.txt'), 'w') as f:
+                f.write(text.getvalue())
+        return len(ranked)
+
+    def summary_lines(self):
+        """
+        処理段階ごとの合計・パーセンタイルの集計結果
+        """
+        if not self.records:
+            return []
+
+        def describe(values):
+            values = np.asarray(values)
+            parts = [f"total {values.sum():8.2f}s"]
+            parts += [f"p{p} {np.percentile(values, p):7.3f}s" for p in PERCENTILES]
+            parts.append(f"max {values.max():7.3f}s")
+            return " ".join(parts)
+
+        stage_names = []
+        for record in self.records:
+            for name in record['stages']:
+                if name not in stage_names:
+                    stage_names.append(name)
+
+        lines = [f"Stage timings ({len(self.records)} files):"]
+        for name in stage_names:
+            values = [record['stages'].get(name, 0.0) for record in self.records]
+            lines.append(f"- {name:<15} {describe(values)}")
+        lines.append(f"- {'file':<15} {describe([record['wall_sec'] for record in self.records])}")
+
+        total_wall = sum(record['wall_sec'] for record in self.records)
+        total_audio = sum(record['audio_sec'] for record in self.records)
+        if total_wall > 0:
+            lines.append(f"Audio processed: {total_audio:.1f}s ({total_audio / total_wall:.1f} audio sec/sec)")
+        lines.append(f"Peak RSS: {max(record['peak_rss_mb'] for record in self.records):.1f}MB")
+        return lines
+
+    def close(self):
+        """
+        ログを閉じ、cProfile結果を保存する
+        Returns:
+            int: 保存したcProfile結果の件数
+        """
+        if self.log_file is not None:
+            self.log_file.close()
+            self.log_file = None
+        if self._slowest:
+            return self._dump_slowest()
+        return 0
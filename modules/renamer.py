@@ -1,19 +1,246 @@
 # modules/renamer.py
 
 import os
+import json
+import time
+import uuid
+import queue
+import threading
 
-def rename_file(file_path, judgment, logger):
-    if judgment == 'chord':
-        dir_name, base_name = os.path.split(file_path)
-        if '_MLD' in base_name:
-            new_base_name = base_name.replace('_MLD', '_CHP')
-            new_file_path = os.path.join(dir_name, new_base_name)
-            if not os.path.exists(new_file_path):
+# 1回にまとめて処理するリネームの最大件数
+RENAME_BATCH_SIZE = 256
+
+def rename_target(file_path):
+    """
+    CHORDと判定されたファイルのリネーム先（"_MLD"を含まない場合はNone）
+    """
+    dir_name, base_name = os.path.split(file_path)
+    if '_MLD' not in base_name:
+        return None
+    return os.path.join(dir_name, base_name.replace('_MLD', '_CHP'))
+
+class RenameWriter:
+    """
+    判定結果を受け取り、バックグラウンドのスレッドでまとめてリネームする
+    - ディレクトリごとに1度だけ一覧を取得し、リネーム先の衝突を一覧で判定する
+    - リネームの前後をジャーナル（JSON Lines、追記のみ）に書き、中断した実行の再開・取り消しに使う
+    - planの場合はディスクを変更せず、リネームの一覧だけを作る
+    """
+    def __init__(self, logger, journal_path=None, plan=False):
+        self.logger = logger
+        self.plan = plan
+        self.planned = []   # (元のパス, リネーム先のパス)
+        self.renamed = 0
+        self.skipped = 0
+        # 同じ秒に開始した実行と区別できるようにプロセスIDと乱数を付ける
+        self.run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.journal = None
+        if journal_path and not plan:
+            self.journal = _open_journal(journal_path)
+
+        self._listings = {}  # ディレクトリ → ファイル名の集合
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, file_path, judgment):
+        """
+        1ファイル分の判定結果を渡す（CHORDのファイルだけリネームの対象にする）
+        """
+        if judgment != 'chord':
+            self.logger.info(f"No action taken for: {file_path}")
+            return
+        self._queue.put(file_path)
+
+    def close(self):
+        """
+        残りのリネームを全て処理してスレッドを終了する
+        Returns:
+            list: planの場合はリネームの一覧 [(元のパス, リネーム先のパス), ...]
+        """
+        self._queue.put(None)
+        self._thread.join()
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+        return self.planned
+
+    def _run(self):
+        finished = False
+        while not finished:
+            batch = [self._queue.get()]
+            while len(batch) < RENAME_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                finished = True
+                batch = [file_path for file_path in batch if file_path is not None]
+
+            by_directory = {}
+            for file_path in batch:
+                by_directory.setdefault(os.path.dirname(file_path), []).append(file_path)
+            for directory, file_paths in by_directory.items():
+                try:
+                    self._rename_in_directory(directory, file_paths)
+                except Exception as e:
+                    self.logger.error(f"Error renaming files in {directory}: {e}")
+
+    def _listing(self, directory):
+        names = self._listings.get(directory)
+        if names is None:
+            names = set(os.listdir(directory or '.'))
+            self._listings[directory] = names
+        return names
+
+    def _rename_in_directory(self, directory, file_paths):
+        """
+        同じディレクトリのファイルをまとめてリネームする
+        """
+        names = self._listing(directory)
+        renames = []
+        for file_path in file_paths:
+            new_file_path = rename_target(file_path)
+            if new_file_path is None:
+                self.logger.warning(f"File does not contain '_MLD': {file_path}")
+                continue
+            new_name = os.path.basename(new_file_path)
+            if new_name in names:
+                self.logger.warning(f"File not renamed to avoid overwrite: {new_file_path}")
+                self.skipped += 1
+                continue
+            # 同じ実行内の後続ファイルとの衝突も一覧で判定する
+            names.discard(os.path.basename(file_path))
+            names.add(new_name)
+            renames.append((file_path, new_file_path))
+
+        if self.plan:
+            self.planned.extend(renames)
+            return
+
+        self._write_journal('pending', renames)
+        done = []
+        for file_path, new_file_path in renames:
+            try:
                 os.rename(file_path, new_file_path)
-                logger.info(f"Renamed: {file_path} -> {new_file_path}")
-            else:
-                logger.warning(f"File not renamed to avoid overwrite: {new_file_path}")
+            except OSError as e:
+                self.logger.error(f"Error renaming {file_path}: {e}")
+                names.discard(os.path.basename(new_file_path))
+                names.add(os.path.basename(file_path))
+                continue
+            self.logger.info(f"Renamed: {file_path} -> {new_file_path}")
+            done.append((file_path, new_file_path))
+        self._write_journal('done', done)
+        self.renamed += len(done)
+
+    def _write_journal(self, state, renames):
+        if self.journal is None or not renames:
+            return
+        for file_path, new_file_path in renames:
+            entry = {'run': self.run_id, 'state': state, 'src': file_path, 'dst': new_file_path}
+            self.journal.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self.journal.flush()
+        os.fsync(self.journal.fileno())
+
+def _open_journal(journal_path):
+    """
+    ジャーナルを追記用に開く（中断で改行が書かれなかった最終行の後ろに続けて書かないようにする）
+    """
+    journal = open(journal_path, 'a+b')
+    if journal.tell() > 0:
+        journal.seek(-1, os.SEEK_END)
+        if journal.read(1) != b'\n':
+            journal.write(b'\n')
+    journal.close()
+    return open(journal_path, 'a')
+
+def _read_journal(journal_path):
+    entries = []
+    with open(journal_path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                # 書き込み途中で中断した行は無視する
+                continue
+    return entries
+
+def resume_renames(journal_path, logger):
+    """
+    ジャーナルでpendingのまま終わったリネームを完了させる
+    Returns:
+        int: 完了させた件数
+    """
+    if not os.path.exists(journal_path):
+        return 0
+    states = {}
+    for entry in _read_journal(journal_path):
+        states[(entry['src'], entry['dst'])] = entry
+
+    completed = []
+    for (src, dst), entry in states.items():
+        if entry['state'] != 'pending':
+            continue
+        src_exists, dst_exists = os.path.exists(src), os.path.exists(dst)
+        if src_exists and dst_exists:
+            # リネーム先に別のファイルができている → 上書きせず、pendingのまま残す
+            logger.warning(f"Cannot resume rename, both source and destination exist: {src} -> {dst}")
+            continue
+        if src_exists:
+            os.rename(src, dst)
+            logger.info(f"Renamed: {src} -> {dst}")
+        elif not dst_exists:
+            logger.warning(f"Cannot resume rename, source is missing: {src}")
+            continue
+        # リネーム先だけがある場合は中断前にリネーム済み
+        completed.append(dict(entry, state='done'))
+
+    _append_journal(journal_path, completed)
+    return len(completed)
+
+def undo_renames(journal_path, logger, run_id=None):
+    """
+    ジャーナルに記録された最後の実行（またはrun_idの実行）のリネームを取り消す
+    Returns:
+        int: 取り消した件数
+    """
+    if not os.path.exists(journal_path):
+        return 0
+    entries = _read_journal(journal_path)
+    if run_id is None:
+        runs = [entry['run'] for entry in entries if entry['state'] == 'done']
+        if not runs:
+            return 0
+        run_id = runs[-1]
+
+    states = {}
+    for entry in entries:
+        if entry['run'] == run_id:
+            states[(entry['src'], entry['dst'])] = entry
+
+    undone = []
+    for (src, dst), entry in reversed(list(states.items())):
+        if entry['state'] != 'done':
+            continue
+        if os.path.exists(dst) and not os.path.exists(src):
+            os.rename(dst, src)
+            logger.info(f"Restored: {dst} -> {src}")
+            undone.append(dict(entry, state='undone'))
         else:
-            logger.warning(f"File does not contain '_MLD': {file_path}")
-    else:
-        logger.info(f"No action taken for: {file_path}")
\ No newline at end of file
+            logger.warning(f"Cannot undo rename: {dst} -> {src}")
+
+    _append_journal(journal_path, undone)
+    return len(undone)
+
+def _append_journal(journal_path, entries):
+    if not entries:
+        return
+    with _open_journal(journal_path) as f:
+        for entry in entries:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
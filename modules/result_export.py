@@ -0,0 +1,272 @@
+# modules/result_export.py
+
+import os
+import json
+import contextlib
+import contextvars
+
+import numpy as np
+
+# 処理中のファイルのフレームごとの値の記録先（記録しない場合はNone）
+_current_frames = contextvars.ContextVar('current_frames', default=None)
+
+# 常に出力する列（文字列・真偽値の列）
+STRING_COLUMNS = ('path', 'verdict', 'method', 'error')
+BOOL_COLUMNS = ('from_manifest',)
+# 最初の行グループにない列の値をまとめるJSON文字列の列
+EXTRA_COLUMN = 'extra_json'
+# フレームごとの値の列
+FRAME_COLUMNS = {
+    'frame_rms_db': np.float32,         # フレーム音量（dB）
+    'frame_active_pitches': np.int16,   # 同時に検出されたピッチ数
+    'frame_type': np.int8,              # FRAME_MELODY / FRAME_CHORD（分析対象外は-1）
+}
+
+class FrameCapture:
+    """
+    1ファイル分のフレームごとの値（ストリーミング解析ではウィンドウごとに追加される）
+    """
+    def __init__(self):
+        self.chunks = {name: [] for name in FRAME_COLUMNS}
+
+    def append(self, frame_volumes, pitch_frames, valid_frames, frame_types):
+        frame_type = np.full(len(frame_volumes), -1, dtype=np.int8)
+        frame_type[valid_frames] = frame_types
+        self.chunks['frame_rms_db'].append(np.asarray(frame_volumes, dtype=np.float32))
+        self.chunks['frame_active_pitches'].append(pitch_frames.active_counts)
+        self.chunks['frame_type'].append(frame_type)
+
+    def arrays(self):
+        return {
+            name: np.concatenate(chunks) if chunks else np.zeros(0, dtype=FRAME_COLUMNS[name])
+            for name, chunks in self.chunks.items()
+        }
+
+@contextlib.contextmanager
+def capture_frames(enabled=True):
+    """
+    with内でanalyze_frame_typesに渡されたフレームごとの値を記録する（enabledでなければNoneを返す）
+    """
+    if not enabled:
+        yield None
+        return
+    capture = FrameCapture()
+    token = _current_frames.set(capture)
+    try:
+        yield capture
+    finally:
+        _current_frames.reset(token)
+
+def record_frames(frame_volumes, pitch_frames, valid_frames, frame_types):
+    """
+    フレームごとの値を記録する（capture_framesの外では何もしない）
+    """
+    capture = _current_frames.get()
+    if capture is not None:
+        capture.append(frame_volumes, pitch_frames, valid_frames, frame_types)
+
+def open_result_writer(config, logger=None):
+    """
+    設定に従って結果の出力先を開く（result_export_pathが未設定の場合はNone）
+    """
+    path = config.get('result_export_path', None)
+    if not path:
+        return None
+    return ResultWriter(
+        path,
+        config.get('judgment_method', 'two_stage'),
+        config.get('result_export_frames', False),
+        config.get('result_export_row_group', 1000),
+        logger,
+    )
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        return None
+    return pyarrow
+
+class ResultWriter:
+    """
+    ファイルごとの結果（判定・統計情報・処理時間）を列形式で書き出す
+    - 拡張子が.parquetならParquet（pyarrowが必要）、それ以外はNPZの行グループファイルのディレクトリ
+    - row_group_size件ごとに1つの行グループとして書き出し、保持する行数を一定に抑える
+    - 列は最初の行グループで決まり、以降に現れた列の値はextra_jsonにJSONでまとめる
+    """
+    def __init__(self, path, method, include_frames=False, row_group_size=1000, logger=None):
+        self.method = method
+        self.include_frames = include_frames
+        self.row_group_size = max(1, row_group_size)
+        self.rows = []
+        self.columns = None
+        self.parts = 0
+        self.written = 0
+
+        self.pyarrow = None
+        if path.endswith('.parquet'):
+            self.pyarrow = _import_pyarrow()
+            if self.pyarrow is None:
+                path = os.path.splitext(path)[0] + '_npz'
+                if logger is not None:
+                    logger.warning(f"pyarrow is not installed, writing NPZ row groups to {path}/ instead")
+        self.path = path
+        self.parquet_writer = None
+        if self.pyarrow is None:
+            os.makedirs(path, exist_ok=True)
+            # 前回の実行の行グループファイルが残らないようにする
+            for name in os.listdir(path):
+                if name.startswith('part-') and name.endswith('.npz'):
+                    os.remove(os.path.join(path, name))
+
+    def add(self, result):
+        self.rows.append(self._row(result))
+        if len(self.rows) >= self.row_group_size:
+            self._flush()
+
+    def close(self):
+        """
+        残りの行を書き出して閉じる
+        Returns:
+            int: 書き出した行数
+        """
+        self._flush()
+        if self.parquet_writer is not None:
+            self.parquet_writer.close()
+            self.parquet_writer = None
+        return self.written
+
+    def _row(self, result):
+        row = {
+            'path': result['file_path'],
+            'verdict': result['judgment'],
+            'method': self.method,
+            'error': result['error'],
+            'from_manifest': bool(result.get('from_manifest', False)),
+        }
+        for key, value in (result['stats'] or {}).items():
+            row[f"stats.{key}"] = value
+        profile = result['profile']
+        if profile is not None:
+            for key in ('wall_sec', 'cpu_sec', 'audio_sec', 'peak_rss_mb'):
+                row[key] = profile[key]
+            for name, value in profile['stages'].items():
+                row[f"stage.{name}"] = value['wall_sec']
+        if self.include_frames:
+            row['frames'] = result.get('frames')
+        return row
+
+    def _flush(self):
+        if not self.rows:
+            return
+        rows = self.rows
+        self.rows = []
+
+        if self.columns is None:
+            numeric = set()
+            for row in rows:
+                numeric.update(key for key in row if key not in STRING_COLUMNS + BOOL_COLUMNS + ('frames',))
+            self.columns = list(STRING_COLUMNS + BOOL_COLUMNS) + sorted(numeric)
+
+        columns = {}
+        for name in self.columns:
+            values = [row.get(name) for row in rows]
+            if name in STRING_COLUMNS:
+                columns[name] = values
+            elif name in BOOL_COLUMNS:
+                columns[name] = np.array(values, dtype=bool)
+            else:
+                columns[name] = np.array([np.nan if v is None else float(v) for v in values], dtype=np.float64)
+        known = set(self.columns) | {'frames'}
+        columns[EXTRA_COLUMN] = [
+            json.dumps({k: v for k, v in row.items() if k not in known}, default=float) for row in rows
+        ]
+        frames = [row.get('frames') for row in rows] if self.include_frames else None
+
+        if self.pyarrow is not None:
+            self._write_parquet(columns, frames)
+        else:
+            self._write_npz(columns, frames)
+        self.parts += 1
+        self.written += len(rows)
+
+    def _write_parquet(self, columns, frames):
+        pa = self.pyarrow
+        arrays = {}
+        for name, values in columns.items():
+            if name in STRING_COLUMNS or name == EXTRA_COLUMN:
+                arrays[name] = pa.array(values, type=pa.string())
+            else:
+                arrays[name] = pa.array(values)
+        if frames is not None:
+            for name, dtype in FRAME_COLUMNS.items():
+                arrays[name] = pa.array(
+                    [None if f is None else f[name] for f in frames],
+                    type=pa.list_(pa.from_numpy_dtype(dtype))
+                )
+        table = pa.table(arrays)
+        if self.parquet_writer is None:
+            self.parquet_writer = pa.parquet.ParquetWriter(self.path, table.schema)
+        self.parquet_writer.write_table(table)
+
+    def _write_npz(self, columns, frames):
+        arrays = {}
+        for name, values in columns.items():
+            if name in STRING_COLUMNS or name == EXTRA_COLUMN:
+                arrays[name] = np.array(['' if v is None else v for v in values], dtype=str)
+            else:
+                arrays[name] = values
+        if frames is not None:
+            # 長さの異なるフレームごとの値は連結配列とオフセット配列で保存する
+            lengths = [0 if f is None else len(f['frame_type']) for f in frames]
+            offsets = np.zeros(len(frames) + 1, dtype=np.int64)
+            np.cumsum(lengths, out=offsets[1:])
+            arrays['frame_offsets'] = offsets
+            for name, dtype in FRAME_COLUMNS.items():
+                chunks = [f[name] for f in frames if f is not None]
+                arrays[name] = np.concatenate(chunks) if chunks else np.zeros(0, dtype=dtype)
+        np.savez(os.path.join(self.path, f"part-{self.parts:05d}.npz"), **arrays)
+
+def load_results(path):
+    """
+    ResultWriterで書き出した結果を読み込む
+    Returns:
+        dict: 列名 → 配列（フレームごとの値の列はファイルごとの配列のobject配列）
+    """
+    if os.path.isfile(path):
+        pa = _import_pyarrow()
+        if pa is None:
+            raise ImportError("pyarrow is required to read Parquet results")
+        table = pa.parquet.read_table(path)
+        results = {}
+        for name in table.column_names:
+            if name in FRAME_COLUMNS:
+                values = table.column(name).to_pylist()
+                column = np.empty(len(values), dtype=object)
+                for i, value in enumerate(values):
+                    column[i] = None if value is None else np.asarray(value, dtype=FRAME_COLUMNS[name])
+                results[name] = column
+            elif name in STRING_COLUMNS or name == EXTRA_COLUMN:
+                results[name] = np.array(table.column(name).to_pylist(), dtype=object)
+            else:
+                results[name] = table.column(name).to_numpy()
+        return results
+
+    parts = sorted(name for name in os.listdir(path) if name.startswith('part-') and name.endswith('.npz'))
+    columns = {}
+    for name in parts:
+        with np.load(os.path.join(path, name)) as part:
+            offsets = part['frame_offsets'] if 'frame_offsets' in part.files else None
+            for key in part.files:
+                if key == 'frame_offsets':
+                    continue
+                if key in FRAME_COLUMNS:
+                    values = part[key]
+                    column = np.empty(len(offsets) - 1, dtype=object)
+                    for i in range(len(column)):
+                        column[i] = values[offsets[i]:offsets[i + 1]]
+                    columns.setdefault(key, []).append(column)
+                else:
+                    columns.setdefault(key, []).append(part[key])
+    return {key: np.concatenate(values) for key, values in columns.items()}
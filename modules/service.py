@@ -0,0 +1,318 @@
+# modules/service.py
+
+import os
+import json
+import time
+import signal
+import threading
+import collections
+import socketserver
+import multiprocessing
+import http.server
+
+import numpy as np
+
+from .batch_runner import PREFETCH_PER_WORKER, _create_pool, _process_in_worker, _error_result
+from .file_finder import iter_wav_files
+
+# 先頭のファイルの結果を待つ間隔（プールが作り直されたかどうかをこの間隔で確認する）
+_POLL_SEC = 0.5
+# メトリクスのレイテンシの集計に使う直近のリクエスト数
+_LATENCY_WINDOW = 1000
+
+def _worker_ready(_):
+    return os.getpid()
+
+class WarmPool:
+    """
+    常駐するワーカープロセスのプール（起動時に1度だけ作り、全てのリクエストで使い回す）
+    - 各ワーカーは起動時にライブラリの読み込み・多ピッチ推定器と判定方式の構築を済ませる
+    - 1ファイルがfile_timeout_secを超えたらプールを作り直し、他のリクエストの未完了のファイルは新しいプールで再実行する
+    """
+    def __init__(self, config, workers):
+        self.workers = workers
+        self.config = config
+        self.timeout = config.get('file_timeout_sec', 600)
+        self.lock = threading.Lock()
+        self.generation = 0  # プールを作り直した回数
+        self.pool = self._start_pool()
+
+    def _start_pool(self):
+        pool = _create_pool(self.config, self.workers)
+        # 初期化が終わるまで待ち、最初のリクエストから解析時間だけで応答できるようにする
+        # （作り直す場合もロックを持ったまま待ち、初期化の時間が次のファイルのタイムアウトに数えられないようにする）
+        pool.map(_worker_ready, range(self.workers), chunksize=1)
+        return pool
+
+    def _submit(self, file_path):
+        with self.lock:
+            return self.generation, self.pool.apply_async(_process_in_worker, (file_path,))
+
+    def _rebuild(self, generation):
+        with self.lock:
+            if self.generation != generation:
+                return
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = self._start_pool()
+            self.generation += 1
+
+    def iter_results(self, file_paths):
+        """
+        ファイルを投入し、結果を入力順に返す（投入済みで結果を返していないファイル数はワーカー数に比例して制限する）
+        """
+        file_paths = iter(file_paths)
+        window = self.workers * PREFETCH_PER_WORKER
+        # [file_path, 投入したプールの世代, AsyncResult, 先頭で待ち始めた時刻] の入力順のキュー
+        queued = collections.deque()
+        exhausted = False
+        while True:
+            while not exhausted and len(queued) < window:
+                file_path = next(file_paths, None)
+                if file_path is None:
+                    exhausted = True
+                    break
+                queued.append([file_path, *self._submit(file_path), None])
+            if not queued:
+                break
+
+            entry = queued[0]
+            file_path, generation, async_result, waiting_since = entry
+            if waiting_since is None:
+                entry[3] = waiting_since = time.monotonic()
+            try:
+                result = async_result.get(_POLL_SEC)
+            except multiprocessing.TimeoutError:
+                if generation != self.generation:
+                    # 他のリクエストのタイムアウトでプールが作り直された → 新しいプールで再実行する
+                    for pending in queued:
+                        if pending[1] != self.generation and not pending[2].ready():
+                            pending[1], pending[2] = self._submit(pending[0])
+                            pending[3] = None
+                    continue
+                if time.monotonic() - waiting_since <= self.timeout:
+                    continue
+                self._rebuild(generation)
+                result = _error_result(file_path, f"Timed out after {self.timeout}s (worker hung or crashed)")
+            except Exception as e:
+                result = _error_result(file_path, str(e))
+            queued.popleft()
+            yield result
+
+    def close(self):
+        with self.lock:
+            self.pool.terminate()
+            self.pool.join()
+
+class ServiceMetrics:
+    """
+    リクエスト数・処理したファイル数・レイテンシなど（/metrics で返す）
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.requests = collections.Counter()  # エンドポイント → リクエスト数
+        self.rejected = 0                       # 同時リクエスト数の上限で断った数
+        self.in_flight = 0
+        self.files = 0
+        self.errors = 0
+        self.analysis_sec = 0.0
+        self.latencies = collections.deque(maxlen=_LATENCY_WINDOW)
+
+    def snapshot(self, pool):
+        with self.lock:
+            latencies = np.asarray(self.latencies or [0.0])
+            return {
+                'uptime_sec': time.time() - self.started,
+                'workers': pool.workers,
+                'pool_restarts': pool.generation,
+                'requests': dict(self.requests),
+                'rejected': self.rejected,
+                'in_flight': self.in_flight,
+                'files': self.files,
+                'errors': self.errors,
+                'analysis_sec': self.analysis_sec,
+                'latency_sec': {
+                    'p50': float(np.percentile(latencies, 50)),
+                    'p90': float(np.percentile(latencies, 90)),
+                    'p99': float(np.percentile(latencies, 99)),
+                    'max': float(latencies.max()),
+                },
+            }
+
+def _file_result(result, detail):
+    """
+    1ファイルの結果をJSONにする（detailならstats・出力・処理時間も含める）
+    """
+    entry = {
+        'path': result['file_path'],
+        'judgment': result['judgment'],
+        'error': result['error'],
+    }
+    if detail:
+        entry['stats'] = result['stats']
+        entry['output'] = result['output']
+        profile = result['profile']
+        entry['profile'] = None if profile is None else {
+            key: profile[key] for key in ('wall_sec', 'cpu_sec', 'audio_sec', 'peak_rss_mb', 'stages')
+        }
+    return entry
+
+class _BadRequest(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class AnalysisService:
+    """
+    判定リクエストを受け付けるサービス
+    - POST /analyze: 判定・統計情報・判定結果の出力・処理時間を返す
+    - POST /judge:   判定だけを返す
+      本文は {"path": ファイル} / {"paths": [ファイル, ...]} / {"directory": ディレクトリ} のいずれか（組み合わせ可）
+      ディレクトリは main.py と同じ条件・階層順で対象ファイルを探す。リネームはしない
+    - GET /health, GET /metrics
+    同時に処理するリクエスト数はmax_requestsまでで、超えた分は503で断る
+    """
+    def __init__(self, config, workers, logger):
+        self.config = config
+        self.logger = logger
+        self.max_requests = config.get('service_max_requests', 4)
+        self.max_files = config.get('service_max_files_per_request', 10000)
+        self.slots = threading.BoundedSemaphore(self.max_requests)
+        self.metrics = ServiceMetrics()
+        self.pool = WarmPool(config, workers)
+
+    def file_paths(self, request):
+        paths = []
+        if 'path' in request:
+            paths.append(request['path'])
+        if not isinstance(request.get('paths', []), list):
+            raise _BadRequest(400, "'paths' must be a list of strings")
+        paths.extend(request.get('paths', []))
+        if not all(isinstance(path, str) for path in paths):
+            raise _BadRequest(400, "'path' must be a string and 'paths' a list of strings")
+        if 'directory' in request:
+            directory = request['directory']
+            if not isinstance(directory, str) or not os.path.isdir(directory):
+                raise _BadRequest(400, f"Invalid directory path: {directory}")
+            paths.extend(iter_wav_files(directory, self.config.get('discovery_threads', 8)))
+        if not paths:
+            raise _BadRequest(400, "Request needs 'path', 'paths' or 'directory'")
+        if len(paths) > self.max_files:
+            raise _BadRequest(413, f"Too many files in one request ({len(paths)} > {self.max_files})")
+        return [os.path.abspath(path) for path in paths]
+
+    def handle(self, endpoint, request):
+        """
+        判定リクエストを処理する
+        Returns:
+            tuple: (HTTPステータス, 応答のdict)
+        """
+        if not self.slots.acquire(blocking=False):
+            with self.metrics.lock:
+                self.metrics.rejected += 1
+            return 503, {'error': f"Too many concurrent requests (limit {self.max_requests})"}
+        started = time.perf_counter()
+        with self.metrics.lock:
+            self.metrics.requests[endpoint] += 1
+            self.metrics.in_flight += 1
+        try:
+            results = []
+            for result in self.pool.iter_results(self.file_paths(request)):
+                results.append(_file_result(result, detail=endpoint == 'analyze'))
+                with self.metrics.lock:
+                    self.metrics.files += 1
+                    if result['error'] is not None:
+                        self.metrics.errors += 1
+                    if result['profile'] is not None:
+                        self.metrics.analysis_sec += result['profile']['wall_sec']
+            elapsed = time.perf_counter() - started
+            return 200, {'count': len(results), 'elapsed_sec': elapsed, 'results': results}
+        except _BadRequest as e:
+            return e.status, {'error': str(e)}
+        finally:
+            with self.metrics.lock:
+                self.metrics.in_flight -= 1
+                self.metrics.latencies.append(time.perf_counter() - started)
+            self.slots.release()
+
+    def close(self):
+        self.pool.close()
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        service = self.server.service
+        if self.path == '/health':
+            self._respond(200, {'status': 'ok', 'workers': service.pool.workers})
+        elif self.path == '/metrics':
+            self._respond(200, service.metrics.snapshot(service.pool))
+        else:
+            self._respond(404, {'error': f"Unknown path: {self.path}"})
+
+    def do_POST(self):
+        endpoint = self.path.strip('/')
+        if endpoint not in ('analyze', 'judge'):
+            self._respond(404, {'error': f"Unknown path: {self.path}"})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length) or b'{}')
+            if not isinstance(request, dict):
+                raise ValueError("Request body must be a JSON object")
+        except ValueError as e:
+            self._respond(400, {'error': f"Invalid JSON: {e}"})
+            return
+        self._respond(*self.server.service.handle(endpoint, request))
+
+    def _respond(self, status, body):
+        encoded = json.dumps(body, default=float, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def address_string(self):
+        # Unixソケットではクライアントのアドレスがない
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        self.server.service.logger.debug(f"{self.address_string()} {format % args}")
+
+class _HTTPServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def _stop(signum, frame):
+    # SIGTERM（docker stopなど）でもCtrl+Cと同じく後片付けしてから終了する
+    raise KeyboardInterrupt
+
+def serve(config, workers, logger, socket_path=None, host='127.0.0.1', port=8765):
+    """
+    サービスを起動し、終了（Ctrl+C・SIGTERM）まで要求を処理する
+    socket_pathを指定した場合はUnixソケット、それ以外はhost:portのHTTPで待ち受ける
+    """
+    service = AnalysisService(config, workers, logger)
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = _UnixHTTPServer(socket_path, _Handler)
+        address = f"unix:{socket_path}"
+    else:
+        server = _HTTPServer((host, port), _Handler)
+        address = f"http://{host}:{server.server_address[1]}"
+    server.service = service
+    logger.info(f"Serving on {address} with {workers} warm workers")
+    signal.signal(signal.SIGTERM, _stop)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
+        logger.info("Service stopped.")
@@ -0,0 +1,387 @@
+# modules/sharding.py
+
+import os
+import json
+import glob
+import time
+import uuid
+import socket
+import shutil
+import hashlib
+import threading
+
+from .file_finder import hierarchy_key
+
+def parse_shard(value):
+    """
+    "i/N" 形式のシャード指定（1 <= i <= N）を (i, N) にする
+    """
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except (AttributeError, ValueError):
+        raise ValueError(f"Invalid shard (expected i/N): {value}")
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f"Invalid shard (expected 1 <= i <= N): {value}")
+    return index, count
+
+def shard_of(rel_path, count):
+    """
+    探索ディレクトリからの相対パスが属するシャード（1〜count）
+    パスの安定したハッシュ値で決めるため、ホスト・実行・ファイルの発見順によらず同じ分割になる
+    """
+    key = rel_path.replace(os.sep, '/').encode('utf-8')
+    digest = hashlib.blake2b(key, digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % count + 1
+
+class ShardLease:
+    """
+    共有ファイルシステム上のシャードのリース（ディレクトリの作成で排他し、中のファイルのmtimeを心拍にする）
+    - 心拍がtimeout_secより古いリースは、持ち主が落ちたとみなして別のシャードが引き継げる
+    - 同じホストの持ち主のプロセスが終了している場合は、心拍が途絶えるのを待たずに取得できる
+    - ホスト間の時計のずれがtimeout_secに比べて十分小さいことを前提にする
+    """
+    def __init__(self, shard_dir, shard, timeout_sec):
+        self.path = os.path.join(shard_dir, 'leases', f"shard-{shard}")
+        self.heartbeat_path = os.path.join(self.path, 'owner.json')
+        self.timeout_sec = timeout_sec
+        self.host = socket.gethostname()
+        self.token = f"{self.host}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+    def acquire(self):
+        """
+        リースを取得する（有効なリースを他が持っている場合はFalse）
+        """
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        try:
+            os.mkdir(self.path)
+        except FileExistsError:
+            if not self._is_stale() and not self._owner_exited():
+                return False
+            # 古いリースを退避してから作り直す（同時に引き継ごうとした場合はmkdirで1つだけが成功する）
+            stale_path = f"{self.path}.stale-{self.token}"
+            try:
+                os.rename(self.path, stale_path)
+            except OSError:
+                pass
+            else:
+                shutil.rmtree(stale_path, ignore_errors=True)
+            try:
+                os.mkdir(self.path)
+            except FileExistsError:
+                return False
+        with open(self.heartbeat_path, 'w') as f:
+            json.dump({'owner': self.token, 'host': self.host, 'pid': os.getpid(), 'acquired': time.time()}, f)
+        return True
+
+    def exists(self):
+        """
+        このシャードのリースが（有効・心拍の途絶にかかわらず）作られているかどうか
+        """
+        return os.path.isdir(self.path)
+
+    def _is_stale(self):
+        try:
+            heartbeat = os.stat(self.heartbeat_path).st_mtime
+        except FileNotFoundError:
+            # 取得の途中（心拍のファイルがまだない）の場合はディレクトリの作成時刻で判断する
+            try:
+                heartbeat = os.stat(self.path).st_mtime
+            except FileNotFoundError:
+                return True
+        return time.time() - heartbeat > self.timeout_sec
+
+    def _owner_exited(self):
+        """
+        持ち主が同じホストの終了したプロセスかどうか（他のホストの持ち主は心拍でしか判断できない）
+        """
+        try:
+            with open(self.heartbeat_path) as f:
+                owner = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if owner.get('host') != self.host or owner.get('pid') in (None, os.getpid()):
+            return False
+        try:
+            os.kill(owner['pid'], 0)
+        except ProcessLookupError:
+            return True
+        except OSError:
+            pass
+        return False
+
+    def is_owned(self):
+        try:
+            with open(self.heartbeat_path) as f:
+                return json.load(f).get('owner') == self.token
+        except (OSError, ValueError):
+            return False
+
+    def refresh(self):
+        try:
+            os.utime(self.heartbeat_path)
+        except OSError:
+            pass
+
+    def release(self):
+        try:
+            os.remove(self.heartbeat_path)
+            os.rmdir(self.path)
+        except OSError:
+            pass
+
+def _check_shard_count(shard_dir, count):
+    """
+    シャード数を記録する（記録済みのシャード数と異なる場合は分割が変わるためエラーにする）
+    """
+    path = os.path.join(shard_dir, 'shards.json')
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+    except FileExistsError:
+        recorded = read_shard_count(shard_dir)
+        if recorded != count:
+            raise ValueError(f"{shard_dir} was partitioned into {recorded} shards, not {count}")
+        return
+    with os.fdopen(fd, 'w') as f:
+        json.dump({'count': count}, f)
+
+def read_shard_count(shard_dir):
+    """
+    記録済みのシャード数（未記録ならNone）
+    """
+    try:
+        with open(os.path.join(shard_dir, 'shards.json')) as f:
+            return json.load(f)['count']
+    except FileNotFoundError:
+        return None
+
+def _done_path(shard_dir, shard):
+    return os.path.join(shard_dir, f"shard-{shard}.done")
+
+def _results_pattern(shard_dir, shard='*'):
+    return os.path.join(shard_dir, 'results', f"shard-{shard}.*.jsonl")
+
+def _read_results(paths):
+    """
+    シャードの結果ファイルを読み込む（書き込み途中の最後の行は無視する）
+    同じファイルの結果が複数ある場合は、エラーの結果より成功した結果を優先する
+    Returns:
+        dict: 相対パス → 結果
+    """
+    results = {}
+    for path in sorted(paths):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                previous = results.get(entry['rel_path'])
+                if previous is None or previous['error'] is not None or entry['error'] is None:
+                    results[entry['rel_path']] = entry
+    return results
+
+class ShardRun:
+    """
+    --shard i/N の実行
+    - 探索した対象ファイルのうち、相対パスのハッシュ値がこのシャードに属するものだけを処理する
+    - 処理した結果はシャードごと・書き込むプロセスごとのJSON Linesに追記する（中断後の再実行では成功を記録済みのファイルを省略する）
+    - エラーになったファイルがあるシャードは完了にせず、再実行・引き継ぎでそのファイルだけを処理し直す
+    - 自分のシャードが終わったら、持ち主の心拍が途絶えた未完了のシャードを引き継いで残りを処理する
+      リースが1度も作られていないシャードは、持ち主がまだ起動していないだけの場合があるため、
+      この実行の開始からlease_timeout_secが経つまで待っても始まらなかった場合だけ引き継ぐ
+    """
+    def __init__(self, directory, shard, count, shard_dir, lease_timeout_sec, logger):
+        self.directory = directory
+        self.shard = shard
+        self.count = count
+        self.shard_dir = shard_dir
+        self.lease_timeout_sec = lease_timeout_sec
+        self.logger = logger
+        self.started = time.time()
+        self.writer_id = f"{socket.gethostname()}-{os.getpid()}"
+        os.makedirs(os.path.join(shard_dir, 'results'), exist_ok=True)
+        _check_shard_count(shard_dir, count)
+
+        self.lock = threading.Lock()
+        self.leases = {}      # 取得中のシャード → ShardLease
+        self.files = {}       # 結果ファイル（シャードごと）
+        self.pending = {}     # シャード → 投入済みで結果を記録していないファイル数
+        self.listed = set()   # ファイルを全て投入し終えたシャード
+        self.processed = {}   # シャード → このプロセスで記録した件数
+        self.failed = {}      # シャード → このプロセスで記録したエラーの件数
+        self.unstarted = []   # iter_filesで後回しにしたリースのないシャード
+        self.stop = threading.Event()
+        self.heartbeat = threading.Thread(target=self._heartbeat, daemon=True)
+        self.heartbeat.start()
+
+    def iter_files(self, walk):
+        """
+        このシャード、続いて心拍の途絶えたシャードを引き継いで、未処理のファイルを返す
+        リースのないシャードは待たずに後回しにする（iter_unstarted_filesで引き継ぐ）
+        walk: 対象ファイルを探索順に返すイテレータを作る関数（シャードごとに探索し直す）
+        """
+        yield from self._iter_shard(self.shard, walk)
+
+        self.unstarted = []
+        for shard in range(1, self.count + 1):
+            if shard == self.shard or self._is_done(shard):
+                continue
+            lease = ShardLease(self.shard_dir, shard, self.lease_timeout_sec)
+            if not lease.exists() and time.time() - self.started < self.lease_timeout_sec:
+                self.unstarted.append(shard)
+                continue
+            yield from self._iter_shard(shard, walk, lease)
+
+    def iter_unstarted_files(self, walk):
+        """
+        iter_filesで後回しにしたリースのないシャードを、この実行の開始からlease_timeout_secが経っても
+        持ち主が始めていなければ引き継ぎ、未処理のファイルを返す
+        解析は先読みするため、iter_filesのファイルの結果を全て記録し終えてから呼ぶ（待つ間に自分のシャードの
+        結果・完了の記録が止まらないようにする）
+        """
+        for shard in self.unstarted:
+            wait_sec = self.started + self.lease_timeout_sec - time.time()
+            if wait_sec > 0 and not self._is_done(shard):
+                self.logger.info(f"Waiting {wait_sec:.0f}s for the owner of shard {shard}/{self.count} to start")
+                time.sleep(wait_sec)
+            yield from self._iter_shard(shard, walk)
+
+    def _is_done(self, shard):
+        return os.path.exists(_done_path(self.shard_dir, shard))
+
+    def _iter_shard(self, shard, walk, lease=None):
+        """
+        リースを取得できたシャードの未処理のファイルを返す（有効なリースを他が持っている・完了済みなら何も返さない）
+        """
+        if self._is_done(shard):
+            if shard == self.shard:
+                self.logger.info(f"Shard {shard}/{self.count} is already finished")
+            return
+        if lease is None:
+            lease = ShardLease(self.shard_dir, shard, self.lease_timeout_sec)
+        if not lease.acquire():
+            if shard != self.shard:
+                return
+            # 自分のシャード: 落ちる前の自分のリースが残っている場合があるため、心拍が途絶えるか
+            # 他のプロセスが完了させるまで待つ（他のノードは引き継ぎの順番を過ぎている場合がある）
+            self.logger.warning(
+                f"Shard {shard}/{self.count} is leased by another process, waiting for it to finish or expire"
+            )
+            while not lease.acquire():
+                if self._is_done(shard):
+                    self.logger.info(f"Shard {shard}/{self.count} was finished by another process")
+                    return
+                time.sleep(max(1.0, self.lease_timeout_sec / 4))
+            if self._is_done(shard):
+                # 待つ間に持ち主が完了させてリースを解放した
+                lease.release()
+                self.logger.info(f"Shard {shard}/{self.count} was finished by another process")
+                return
+        if shard != self.shard:
+            self.logger.info(f"Taking over shard {shard}/{self.count}")
+
+        recorded = _read_results(glob.glob(_results_pattern(self.shard_dir, shard)))
+        succeeded = {rel_path for rel_path, entry in recorded.items() if entry['error'] is None}
+        with self.lock:
+            self.leases[shard] = lease
+            self.pending[shard] = 0
+            self.failed[shard] = 0
+            self.processed.setdefault(shard, 0)
+        for file_path in walk():
+            rel_path = os.path.relpath(file_path, self.directory)
+            if shard_of(rel_path, self.count) != shard or rel_path in succeeded:
+                continue
+            with self.lock:
+                self.pending[shard] += 1
+            yield file_path
+        with self.lock:
+            self.listed.add(shard)
+        self._finish_if_complete(shard)
+
+    def record(self, file_path, result):
+        """
+        1ファイルの結果を記録する（シャードの全ファイルの結果がそろったら完了にする）
+        """
+        rel_path = os.path.relpath(file_path, self.directory)
+        shard = shard_of(rel_path, self.count)
+        entry = {
+            'rel_path': rel_path,
+            'shard': shard,
+            'judgment': result['judgment'],
+            'stats': result['stats'],
+            'output': result['output'],
+            'error': result['error'],
+            'profile': result['profile'],
+        }
+        with self.lock:
+            f = self.files.get(shard)
+            if f is None:
+                f = self.files[shard] = open(
+                    os.path.join(self.shard_dir, 'results', f"shard-{shard}.{self.writer_id}.jsonl"),
+                    'a', encoding='utf-8'
+                )
+            f.write(json.dumps(entry, default=float, ensure_ascii=False) + '\n')
+            f.flush()
+            self.pending[shard] -= 1
+            self.processed[shard] += 1
+            if result['error'] is not None:
+                self.failed[shard] += 1
+        self._finish_if_complete(shard)
+
+    def _finish_if_complete(self, shard):
+        with self.lock:
+            if shard not in self.listed or self.pending[shard] > 0 or shard not in self.leases:
+                return
+            lease = self.leases.pop(shard)
+            f = self.files.pop(shard, None)
+            failed = self.failed[shard]
+        if f is not None:
+            os.fsync(f.fileno())
+            f.close()
+        if not lease.is_owned():
+            self.logger.warning(f"Lease of shard {shard}/{self.count} was taken over during processing")
+        if failed:
+            # 完了にせずリースを解放し、再実行・他のノードの引き継ぎでエラーのファイルを処理し直す
+            self.logger.warning(f"Shard {shard}/{self.count}: {failed} files failed, leaving the shard unfinished")
+            lease.release()
+            return
+        with open(_done_path(self.shard_dir, shard), 'w') as done:
+            json.dump({'finished_by': self.writer_id, 'finished': time.time()}, done)
+        lease.release()
+
+    def _heartbeat(self):
+        while not self.stop.wait(max(1.0, self.lease_timeout_sec / 4)):
+            with self.lock:
+                leases = list(self.leases.values())
+            for lease in leases:
+                lease.refresh()
+
+    def close(self):
+        """
+        心拍を止め、未完了のシャードの結果ファイルを閉じる（リースは残し、心拍の途絶で引き継がせる）
+        Returns:
+            dict: シャード → このプロセスで記録した件数
+        """
+        self.stop.set()
+        self.heartbeat.join()
+        with self.lock:
+            for f in self.files.values():
+                f.close()
+            self.files = {}
+        return dict(self.processed)
+
+def merge_shards(shard_dir):
+    """
+    全シャードの結果を1つにまとめ、階層順（file_finder.iter_wav_filesと同じ順）に並べる
+    Returns:
+        tuple: (成功した結果のリスト, エラーのまま残っている結果のリスト, 完了していないシャードのリスト)
+    """
+    count = read_shard_count(shard_dir)
+    if count is None:
+        raise FileNotFoundError(f"No shard results in {shard_dir}")
+    results = _read_results(glob.glob(_results_pattern(shard_dir)))
+    ordered = [results[rel_path] for rel_path in sorted(results, key=hierarchy_key)]
+    merged = [entry for entry in ordered if entry['error'] is None]
+    errors = [entry for entry in ordered if entry['error'] is not None]
+    incomplete = [s for s in range(1, count + 1) if not os.path.exists(_done_path(shard_dir, s))]
+    return merged, errors, incomplete
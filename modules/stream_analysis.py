@@ -0,0 +1,140 @@
+# modules/stream_analysis.py
+
+import numpy as np
+import soundfile as sf
+import librosa
+
+from .feature_extractor import extract_features
+from .frame_volume import compute_frame_volumes, multipitch_frame_count
+from .judge import analyze_frame_types, report_judgment
+from .judgment_methods.factory import get_judgment_method
+from .memory_budget import exceeds_file_budget, budget_window_sec
+from .profiler import stage, set_audio_duration
+
+_PEAK_BLOCK_SIZE = 1024 * 1024
+
+def use_streaming(file_path, config):
+    """
+    ストリーミング解析を使うかどうか
+    streaming_threshold_sec以上の長さのファイルが対象（未設定なら使わない）
+    メモリの上限（--max-memory）がある場合は、全体を読み込むと1ファイルの予算を超えるファイルも対象にする
+    soundfileで読めない形式は対象にしない（全体の読み込みでlibrosa.loadに任せる）
+    """
+    if exceeds_file_budget(file_path, config):
+        return True
+    threshold_sec = config.get('streaming_threshold_sec', None)
+    if threshold_sec is None:
+        return False
+    try:
+        return sf.info(file_path).duration >= threshold_sec
+    except RuntimeError:
+        return False
+
+def _read_mono(sound_file, start, stop):
+    """
+    ネイティブのサンプリングレートで [start, stop) をモノラルのfloat32として読み込む
+    """
+    sound_file.seek(start)
+    block = sound_file.read(stop - start, dtype='float32', always_2d=True)
+    return block.mean(axis=1, dtype=np.float32)
+
+def _find_peak(sound_file):
+    """
+    1パス目: ブロック単位で読み、正規化用のピーク値を求める
+    """
+    peak = 0.0
+    sound_file.seek(0)
+    for block in sound_file.blocks(blocksize=_PEAK_BLOCK_SIZE, dtype='float32', always_2d=True):
+        mono = block.mean(axis=1, dtype=np.float32)
+        if len(mono) > 0:
+            peak = max(peak, float(np.max(np.abs(mono))))
+    return peak
+
+def _load_window(sound_file, start, stop, native_sr, sr, resample_type):
+    """
+    解析レートでのサンプル範囲 [start, stop) を読み込む（必要ならリサンプル）
+    """
+    if native_sr == sr:
+        return _read_mono(sound_file, start, stop)
+
+    native_start = int(np.floor(start * native_sr / sr))
+    native_stop = min(int(np.ceil(stop * native_sr / sr)), sound_file.frames)
+    window = librosa.resample(
+        _read_mono(sound_file, native_start, native_stop), orig_sr=native_sr, target_sr=sr, res_type=resample_type
+    )
+    # リサンプル後の長さの端数を揃える
+    window = window[:stop - start]
+    if len(window) < stop - start:
+        window = np.pad(window, (0, stop - start - len(window)))
+    return window
+
+def judge_streaming(file_path, config, window_sec=None, early_exit=False):
+    """
+    長いファイルをオーバーラップ付きのウィンドウ単位で読み込み・解析し、判定を行う
+    - 正規化は1パス目で求めたピーク値で行う（全体を保持しない二段階方式）
+    - 音量判定と多ピッチ推定はウィンドウごとに行い、統計情報を逐次合算する
+    - 1ファイルあたりのメモリ使用量はファイル長ではなくウィンドウ長で決まる（メモリの上限がある場合は予算に収まる長さにする）
+    - 多ピッチ推定の輪郭選択はウィンドウ内の信号で決まるため、フレームの結果・判定は全体の解析と一致するとは限らない
+    - early_exitの場合、残りのフレームで判定が変わらなくなった時点で読み込み・解析を打ち切る
+    """
+    hop_size = config.get('hop_size', 512)
+    if window_sec is None:
+        window_sec = config.get('stream_window_sec', 30)
+    window_sec = budget_window_sec(window_sec, config)
+    window_frames = max(1, int(window_sec * (config.get('sample_rate') or 44100) / hop_size))
+    # ウィンドウ端の推定結果は使わず、前後のウィンドウと重ねて解析する
+    margin_frames = max(1, int(config.get('stream_overlap_sec', 1) * (config.get('sample_rate') or 44100) / hop_size))
+
+    method_name = config.get('judgment_method', 'two_stage')
+    judgment_method = get_judgment_method(method_name)
+    resample_type = config.get('resample_type', 'soxr_hq')
+
+    with sf.SoundFile(file_path) as sound_file:
+        native_sr = sound_file.samplerate
+        sr = config.get('sample_rate', None) or native_sr
+        num_samples = int(np.ceil(sound_file.frames * sr / native_sr))
+        total_frames = multipitch_frame_count(num_samples, hop_size)
+        set_audio_duration(sound_file.frames / native_sr)
+
+        scale = 1.0
+        if config.get('normalize', True):
+            with stage('peak_scan'):
+                peak = _find_peak(sound_file)
+            if peak > np.finfo(np.float32).tiny:
+                scale = 1.0 / peak
+
+        stats = None
+        first = 0
+        while first < total_frames:
+            last = min(first + window_frames, total_frames)
+            # ウィンドウの格子はサンプル数から決めるため、末尾にパディングのフレームだけが残ることがある
+            # マージン以下の残りは読み込み済みのマージンに含まれるので、このウィンドウで解析する
+            if total_frames - last <= margin_frames:
+                last = total_frames
+
+            # 前後にマージンを付けたウィンドウ（開始位置はフレーム境界に揃える）
+            start = max(first - margin_frames, 0) * hop_size
+            stop = min((last + margin_frames) * hop_size, num_samples)
+            with stage('decode'):
+                y = _load_window(sound_file, start, stop, native_sr, sr, resample_type)
+            with stage('normalize'):
+                y *= scale
+
+            offset = first - start // hop_size
+            count = last - first
+            pitches = extract_features(y, sr, config)[offset:offset + count]
+            with stage('frame_volume'):
+                frame_volumes = compute_frame_volumes(y, config, offset + count)[offset:]
+
+            with stage('frame_analysis'):
+                _, window_stats = analyze_frame_types(frame_volumes, pitches, config, judgment_method)
+                stats = judgment_method.merge_stats(stats, window_stats)
+
+            remaining_frames = total_frames - last
+            if early_exit and remaining_frames > 0:
+                if judgment_method.decided_judgment(stats, remaining_frames, config) is not None:
+                    stats['unanalyzed_frames'] = remaining_frames
+                    break
+            first = last
+
+    return report_judgment(judgment_method, stats, config)
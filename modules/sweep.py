@@ -0,0 +1,153 @@
+# modules/sweep.py
+
+import os
+import csv
+import json
+import itertools
+
+import yaml
+
+from .analysis import get_features
+from .feature_cache import EXTRACTION_PARAMS
+from .judge import analyze_frame_types
+from .pitch_matrix import PitchFrames
+from .judgment_methods.factory import get_judgment_method
+
+# フレームの分析対象（音量判定）に影響する設定
+VOLUME_KEYS = ('min_volume_threshold_db', 'max_volume_threshold_db')
+
+def load_sweep_configs(sweep_path, base_config):
+    """
+    スイープする判定設定の一覧を読み込む
+    - configs: 設定のリスト（各要素は基本設定に上書きする値）
+    - grid: 設定名 → 値のリスト（全ての組み合わせを作る）
+    両方を指定した場合は両方の設定を並べる。先頭には基本設定そのもの（ID: base）を置く
+    Returns:
+        list: (設定ID, 上書きする値, 基本設定に上書きした設定) のリスト
+    """
+    with open(sweep_path, 'r') as file:
+        sweep = yaml.safe_load(file) or {}
+
+    overrides = [dict(entry) for entry in sweep.get('configs', [])]
+    grid = sweep.get('grid', {})
+    if grid:
+        names = list(grid)
+        for values in itertools.product(*(grid[name] for name in names)):
+            overrides.append(dict(zip(names, values)))
+    if not overrides:
+        raise ValueError(f"No configurations in sweep file: {sweep_path}")
+    # 特徴量は全ての設定で共通に1度だけ抽出するため、抽出パラメータはスイープできない
+    for override in overrides:
+        extraction_keys = sorted(set(override) & set(EXTRACTION_PARAMS))
+        if extraction_keys:
+            raise ValueError(f"Extraction parameters cannot be swept: {', '.join(extraction_keys)}")
+
+    return [('base', {}, base_config)] + [
+        (f"c{i:03d}", override, {**base_config, **override})
+        for i, override in enumerate(overrides)
+    ]
+
+def _frame_key(config):
+    """
+    フレーム分析の結果が同じになる設定をまとめるキー
+    """
+    method_name = config.get('judgment_method', 'two_stage')
+    method = get_judgment_method(method_name)
+    keys = VOLUME_KEYS + method.frame_params
+    return (method_name,) + tuple((key, repr(config.get(key))) for key in keys)
+
+def sweep_file(pitches, frame_volumes, sweep_configs):
+    """
+    1ファイルの特徴量から全ての設定の判定結果を求める
+    フレーム分析は設定をフレームに影響する値でまとめて1度ずつ行い、
+    比率の閾値だけが異なる設定は統計情報を使い回して判定する
+    Returns:
+        list: 設定ごとの判定結果
+    """
+    pitch_frames = PitchFrames.from_hz(pitches)
+    stats_by_key = {}
+    verdicts = []
+    for _, _, config in sweep_configs:
+        method = get_judgment_method(config.get('judgment_method', 'two_stage'))
+        key = _frame_key(config)
+        if key not in stats_by_key:
+            _, stats_by_key[key] = analyze_frame_types(frame_volumes, pitch_frames, config, method)
+        stats = stats_by_key[key]
+        analyzed_frames = stats['total_frames'] - stats['skip_frames']
+        verdicts.append(method.make_judgment(stats, analyzed_frames, config))
+    return verdicts
+
+def load_labels(labels_path):
+    """
+    正解ラベル（{ディレクトリからの相対パス: 'chord' or 'melody'}）を読み込む
+    """
+    with open(labels_path, 'r') as file:
+        return json.load(file)
+
+def summarize_sweep(matrix, sweep_configs, labels=None):
+    """
+    設定ごとの集計（CHORDの件数・基本設定との一致率・正解率）
+    matrix: {相対パス: 設定ごとの判定結果}（先頭の設定を基準とする）
+    """
+    summaries = []
+    rel_paths = list(matrix)
+    for i, (config_id, override, _) in enumerate(sweep_configs):
+        verdicts = [matrix[rel_path][i] for rel_path in rel_paths]
+        summary = {
+            'id': config_id,
+            'config': override,
+            'chord': verdicts.count('chord'),
+            'melody': verdicts.count('melody'),
+            'agreement': _ratio(
+                sum(1 for rel_path in rel_paths if matrix[rel_path][i] == matrix[rel_path][0]),
+                len(rel_paths)
+            ),
+        }
+        if labels:
+            labeled = [rel_path for rel_path in rel_paths if rel_path in labels]
+            summary['accuracy'] = _ratio(
+                sum(1 for rel_path in labeled if matrix[rel_path][i] == labels[rel_path]),
+                len(labeled)
+            )
+        summaries.append(summary)
+    return summaries
+
+def _ratio(count, total):
+    return count / total if total > 0 else 0.0
+
+def run_sweep(directory, wav_files, sweep_configs, base_config, cache, logger, labels=None):
+    """
+    ファイルごとに特徴量を1度だけ取得し、全ての設定で判定する
+    Returns:
+        tuple: (判定結果の行列 {相対パス: 設定ごとの判定結果}, 設定ごとの集計)
+    """
+    matrix = {}
+    for file_path in wav_files:
+        rel_path = os.path.relpath(file_path, directory)
+        try:
+            pitches, frame_volumes = get_features(file_path, base_config, cache)
+        except Exception as e:
+            logger.error(f"Error processing {file_path}: {e}")
+            continue
+        matrix[rel_path] = sweep_file(pitches, frame_volumes, sweep_configs)
+    return matrix, summarize_sweep(matrix, sweep_configs, labels)
+
+def write_sweep_results(out_path, matrix, sweep_configs, summaries):
+    """
+    判定結果の行列をCSV（ファイル×設定）に、設定と集計をJSONに書き出す
+    Returns:
+        tuple: (CSVのパス, JSONのパス)
+    """
+    base_path = os.path.splitext(out_path)[0]
+    csv_path = base_path + '.csv'
+    json_path = base_path + '.json'
+
+    with open(csv_path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['file'] + [config_id for config_id, _, _ in sweep_configs])
+        for rel_path, verdicts in matrix.items():
+            writer.writerow([rel_path] + verdicts)
+
+    with open(json_path, 'w') as file:
+        json.dump({'files': len(matrix), 'configs': summaries}, file, indent=2, ensure_ascii=False)
+    return csv_path, json_path
@@ -0,0 +1,96 @@
+# tests/test_decided_judgment.py
+"""
+早期打ち切りで使う decided_judgment が、判定を確定させた場合に残りのフレームの全ての結果で
+make_judgment が同じ判定になることを確かめる（残りのフレームの結果は全て列挙する）
+"""
+
+import itertools
+
+import numpy as np
+import pytest
+
+from modules.judgment_methods.two_stage import TwoStageMethod
+from modules.judgment_methods.pitch_distribution import PitchDistributionMethod
+from modules.judgment_methods.pitch_weighted import PitchWeightedMethod
+
+# 判定方式ごとの chord_conditions が参照するフレーム数
+METHODS = {
+    'two_stage': (TwoStageMethod, ('low_chord_frames', 'chord_frames'),
+                  ('low_chord_ratio_threshold', 'chord_ratio_threshold')),
+    'pitch_distribution': (PitchDistributionMethod, ('wide_range_frames', 'low_range_frames'),
+                           ('wide_range_threshold', 'low_range_threshold')),
+    'pitch_weighted': (PitchWeightedMethod, ('low_chord_frames', 'chord_frames'),
+                       ('low_chord_ratio_threshold', 'chord_ratio_threshold')),
+}
+
+CASES = 3000
+MAX_REMAINING = 5
+
+def partial_stats(rng, keys):
+    """
+    途中までの統計情報（分析済みのフレーム数が0の場合を含む）
+    """
+    analyzed_frames = int(rng.integers(0, 30))
+    skip_frames = int(rng.integers(0, 5))
+    stats = {'total_frames': analyzed_frames + skip_frames, 'skip_frames': skip_frames}
+    for key in keys:
+        stats[key] = int(rng.integers(0, analyzed_frames + 1))
+    return stats
+
+def completions(stats, keys, remaining_frames):
+    """
+    残りのフレームの結果を全て列挙する（分析対象になったフレーム数と、そのうち各条件に数えられたフレーム数）
+    条件どうしの関係（低音和音は和音に含まれるなど）は考慮せず、実際にありうる結果を含む広い範囲を列挙する
+    """
+    for analyzed in range(remaining_frames + 1):
+        for added in itertools.product(range(analyzed + 1), repeat=len(keys)):
+            final = dict(stats)
+            final['total_frames'] += remaining_frames
+            final['skip_frames'] += remaining_frames - analyzed
+            for key, count in zip(keys, added):
+                final[key] += count
+            yield final
+
+@pytest.mark.parametrize('method_name', sorted(METHODS))
+def test_decided_judgment_holds_for_every_completion(method_name):
+    method_class, keys, threshold_names = METHODS[method_name]
+    method = method_class()
+    rng = np.random.default_rng(0)
+
+    decided = {'chord': 0, 'melody': 0, None: 0}
+    for _ in range(CASES):
+        stats = partial_stats(rng, keys)
+        config = {name: float(rng.choice([0.05, 0.1, 0.15, 0.2, 0.3, 0.5, rng.uniform(0.01, 1.0)]))
+                  for name in threshold_names}
+        remaining_frames = int(rng.integers(0, MAX_REMAINING + 1))
+
+        judgment = method.decided_judgment(stats, remaining_frames, config)
+        decided[judgment] += 1
+        if judgment is None:
+            continue
+        for final in completions(stats, keys, remaining_frames):
+            analyzed_frames = final['total_frames'] - final['skip_frames']
+            assert method.make_judgment(final, analyzed_frames, config) == judgment, (stats, remaining_frames, config)
+
+    # 確定・未確定のいずれの場合も検査されている
+    assert decided['chord'] > 0 and decided['melody'] > 0 and decided[None] > 0
+
+@pytest.mark.parametrize('method_name', sorted(METHODS))
+def test_no_remaining_frames_matches_make_judgment(method_name):
+    method_class, keys, threshold_names = METHODS[method_name]
+    method = method_class()
+    rng = np.random.default_rng(1)
+    for _ in range(CASES):
+        stats = partial_stats(rng, keys)
+        analyzed_frames = stats['total_frames'] - stats['skip_frames']
+        assert method.decided_judgment(stats, 0, {}) == method.make_judgment(stats, analyzed_frames, {})
+
+@pytest.mark.parametrize('method_name', sorted(METHODS))
+def test_nothing_analyzed_is_not_decided_as_chord(method_name):
+    # 分析済みのフレームがない場合、残りが全て音量判定で除かれるとメロディになるため和音には確定しない
+    method_class, keys, threshold_names = METHODS[method_name]
+    method = method_class()
+    stats = {'total_frames': 3, 'skip_frames': 3, **{key: 0 for key in keys}}
+    config = {name: 0.0 for name in threshold_names}
+    for remaining_frames in range(1, 10):
+        assert method.decided_judgment(stats, remaining_frames, config) != 'chord'
@@ -0,0 +1,208 @@
+# tests/test_judgment_parity.py
+"""
+配列演算で書き直した判定方式（TwoStageMethod・PitchDistributionMethod）が、
+フレームごとのループで分類していた以前の実装と同じ統計情報・フレーム種別・判定を返すことを確かめる
+
+fixtures/pitch_frames.npz は倍音を含む単音・和音・低音付き和音・無音を0.45秒ずつ並べた合成音
+（44.1kHz、hop_size 512）に対するMultiPitchMelodiaの出力（Hz、pack_pitchesの形式）とフレーム音量（dB）
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+from modules.judge import analyze_frame_types
+from modules.pitch_matrix import hz_to_midi
+from modules.judgment_methods.base import FRAME_CHORD, FRAME_MELODY
+from modules.judgment_methods.two_stage import TwoStageMethod
+from modules.judgment_methods.pitch_distribution import PitchDistributionMethod
+
+FIXTURE_PATH = os.path.join(os.path.dirname(__file__), 'fixtures', 'pitch_frames.npz')
+
+# 以前の実装（フレームごとのループ）
+
+def loop_two_stage(valid_frames, pitches, config):
+    simultaneous_pitch_threshold = config.get('simultaneous_pitch_threshold', 2)
+    low_note_threshold = config.get('low_note_threshold', 48)
+
+    chord_frames = 0
+    melody_frames = 0
+    low_chord_frames = 0
+    frame_types = []
+    for i in valid_frames:
+        frame_pitches = pitches[i]
+        active_pitches = frame_pitches[frame_pitches > 0]
+
+        if len(active_pitches) >= simultaneous_pitch_threshold:
+            chord_frames += 1
+            frame_types.append('chord')
+            if any(pitch <= low_note_threshold for pitch in active_pitches):
+                low_chord_frames += 1
+        else:
+            melody_frames += 1
+            frame_types.append('melody')
+
+    stats = {
+        'chord_frames': chord_frames,
+        'melody_frames': melody_frames,
+        'low_chord_frames': low_chord_frames,
+        'low_chord_ratio': low_chord_frames / len(valid_frames) if len(valid_frames) > 0 else 0,
+        'normal_chord_ratio': chord_frames / len(valid_frames) if len(valid_frames) > 0 else 0
+    }
+    return frame_types, stats
+
+def loop_two_stage_judgment(stats, analyzed_frames, config):
+    if analyzed_frames == 0:
+        return 'melody'
+    low_chord_ratio = stats['low_chord_frames'] / analyzed_frames
+    normal_chord_ratio = stats['chord_frames'] / analyzed_frames
+    is_chord = (low_chord_ratio >= config.get('low_chord_ratio_threshold', 0.1)) or \
+               (normal_chord_ratio >= config.get('chord_ratio_threshold', 0.2))
+    return 'chord' if is_chord else 'melody'
+
+def loop_pitch_distribution(valid_frames, pitches, config):
+    low_threshold = config.get('low_pitch_threshold', 48)
+    high_threshold = config.get('high_pitch_threshold', 72)
+
+    chord_frames = 0
+    melody_frames = 0
+    frame_types = []
+    range_stats = {
+        'low_range_frames': 0,
+        'mid_range_frames': 0,
+        'high_range_frames': 0,
+        'wide_range_frames': 0,
+    }
+    for i in valid_frames:
+        frame_pitches = pitches[i]
+        active_pitches = frame_pitches[frame_pitches > 0]
+
+        if len(active_pitches) > 0:
+            low_notes = sum(1 for p in active_pitches if p <= low_threshold)
+            mid_notes = sum(1 for p in active_pitches if low_threshold < p <= high_threshold)
+            high_notes = sum(1 for p in active_pitches if p > high_threshold)
+
+            if low_notes > 0:
+                range_stats['low_range_frames'] += 1
+            if mid_notes > 0:
+                range_stats['mid_range_frames'] += 1
+            if high_notes > 0:
+                range_stats['high_range_frames'] += 1
+
+            used_ranges = sum(1 for x in [low_notes, mid_notes, high_notes] if x > 0)
+            if used_ranges >= 2:
+                range_stats['wide_range_frames'] += 1
+
+            is_chord = (
+                (low_notes > 0 and (mid_notes > 0 or high_notes > 0)) or
+                (len(active_pitches) >= 3 and mid_notes >= 2) or
+                used_ranges >= 2
+            )
+            if is_chord:
+                chord_frames += 1
+                frame_types.append('chord')
+            else:
+                melody_frames += 1
+                frame_types.append('melody')
+        else:
+            melody_frames += 1
+            frame_types.append('melody')
+
+    stats = {
+        'chord_frames': chord_frames,
+        'melody_frames': melody_frames,
+        **range_stats
+    }
+    return frame_types, stats
+
+def loop_pitch_distribution_judgment(stats, analyzed_frames, config):
+    if analyzed_frames == 0:
+        return 'melody'
+    wide_range_ratio = stats['wide_range_frames'] / analyzed_frames
+    low_range_ratio = stats['low_range_frames'] / analyzed_frames
+    is_chord = (
+        wide_range_ratio >= config.get('wide_range_threshold', 0.15) or
+        low_range_ratio >= config.get('low_range_threshold', 0.1)
+    )
+    return 'chord' if is_chord else 'melody'
+
+METHODS = {
+    'two_stage': (TwoStageMethod, loop_two_stage, loop_two_stage_judgment),
+    'pitch_distribution': (PitchDistributionMethod, loop_pitch_distribution, loop_pitch_distribution_judgment),
+}
+
+CONFIGS = [
+    {},
+    {'simultaneous_pitch_threshold': 3, 'low_note_threshold': 55, 'chord_ratio_threshold': 0.05},
+    {'low_pitch_threshold': 40, 'high_pitch_threshold': 60, 'wide_range_threshold': 0.05},
+    {'min_volume_threshold_db': -6, 'low_chord_ratio_threshold': 0.01, 'low_range_threshold': 0.3},
+]
+
+def load_fixture():
+    data = np.load(FIXTURE_PATH)
+    return data['values'], data['offsets'], data['frame_volumes']
+
+def ragged_hz(values, offsets):
+    """
+    MultiPitchMelodiaの出力と同じ、フレームごとの長さの異なるHzの配列のリスト
+    """
+    return [values[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+
+def loop_pitches(hz_frames):
+    """
+    以前の実装に渡すフレームごとのピッチ（MIDIノート番号、音のない値は0のまま残す）
+    """
+    return [np.where(frame > 0, hz_to_midi(np.maximum(frame, 1e-6)), 0) for frame in hz_frames]
+
+def random_hz_frames(seed, n_frames=500):
+    """
+    0〜5音の和音・音のない値（0）を含むランダムなフレーム
+    """
+    rng = np.random.default_rng(seed)
+    frames = []
+    for _ in range(n_frames):
+        notes = rng.uniform(28, 96, size=rng.integers(0, 6))
+        hz = 440.0 * 2 ** ((notes - 69) / 12)
+        if rng.random() < 0.2:
+            hz = np.append(hz, 0.0)
+        frames.append(hz.astype(np.float32))
+    return frames
+
+def assert_same(method_name, hz_frames, frame_volumes, config):
+    method_class, loop_frames, loop_judgment = METHODS[method_name]
+    method = method_class()
+
+    frame_types, stats = analyze_frame_types(frame_volumes, hz_frames, config, method)
+    analyzed_frames = stats['total_frames'] - stats['skip_frames']
+    valid_frames = np.where(frame_volumes > config.get('min_volume_threshold_db', -24))[0]
+    expected_types, expected_stats = loop_frames(valid_frames, loop_pitches(hz_frames), config)
+
+    method_stats = {key: stats[key] for key in expected_stats}
+    assert method_stats == expected_stats
+    assert all(type(method_stats[key]) is type(expected_stats[key]) for key in expected_stats)
+    assert frame_types.dtype == np.int8
+    assert [('chord' if t == FRAME_CHORD else 'melody') for t in frame_types] == expected_types
+    assert set(np.unique(frame_types)) <= {FRAME_CHORD, FRAME_MELODY}
+    assert method.make_judgment(stats, analyzed_frames, config) == loop_judgment(
+        expected_stats, len(valid_frames), config
+    )
+
+@pytest.mark.parametrize('method_name', sorted(METHODS))
+@pytest.mark.parametrize('config', CONFIGS)
+def test_fixture_matches_loop(method_name, config):
+    values, offsets, frame_volumes = load_fixture()
+    assert_same(method_name, ragged_hz(values, offsets), frame_volumes, config)
+
+@pytest.mark.parametrize('method_name', sorted(METHODS))
+@pytest.mark.parametrize('seed', range(5))
+def test_random_frames_match_loop(method_name, seed):
+    hz_frames = random_hz_frames(seed)
+    frame_volumes = np.random.default_rng(seed).uniform(-40, 0, size=len(hz_frames))
+    for config in CONFIGS:
+        assert_same(method_name, hz_frames, frame_volumes, config)
+
+@pytest.mark.parametrize('method_name', sorted(METHODS))
+def test_no_valid_frames(method_name):
+    values, offsets, frame_volumes = load_fixture()
+    assert_same(method_name, ragged_hz(values, offsets), np.full(len(frame_volumes), -60.0), {})
@@ -0,0 +1,34 @@
+# tests/test_memory_budget.py
+"""
+plan_memory がメモリの上限（max_memory_mb）を超える計画を立てないことを確かめる
+"""
+
+import pytest
+
+from modules.memory_budget import plan_memory, planned_memory_mb
+
+@pytest.mark.parametrize('max_memory_mb', [300, 400, 500, 800, 2000])
+@pytest.mark.parametrize('workers', [1, 2, 4])
+@pytest.mark.parametrize('pipeline_enabled', [True, False])
+def test_plan_fits_budget(max_memory_mb, workers, pipeline_enabled):
+    config = {'max_memory_mb': max_memory_mb, 'pipeline_enabled': pipeline_enabled}
+    workers, file_budget_mb, overrides = plan_memory(config, workers)
+    assert file_budget_mb >= config.get('min_file_memory_mb', 64)
+    assert planned_memory_mb({**config, **overrides}, workers, file_budget_mb) <= max_memory_mb
+
+def test_pipeline_is_reduced_before_disabled():
+    # 400MB: デコード済みで待つファイル数を1に減らせば収まる
+    workers, file_budget_mb, overrides = plan_memory({'max_memory_mb': 400}, 2)
+    assert (workers, overrides) == (1, {'pipeline_decode_depth': 1})
+    # 300MB: パイプラインを無効にしないと収まらない
+    workers, file_budget_mb, overrides = plan_memory({'max_memory_mb': 300}, 1)
+    assert (workers, overrides) == (1, {'pipeline_enabled': False})
+
+def test_too_small_budget_is_reported():
+    config = {'max_memory_mb': 200}
+    workers, file_budget_mb, overrides = plan_memory(config, 1)
+    assert file_budget_mb == 64
+    assert planned_memory_mb({**config, **overrides}, workers, file_budget_mb) > 200
+
+def test_no_limit():
+    assert plan_memory({}, 3) == (3, None, {})